@@ -2,7 +2,8 @@ from flask import Flask
 
 from config import config
 # from external import client, socketio
-from app.external import socketio
+from app.external import socketio, storage
+from app.backplane import socketio_options
 
 
 def create_app(config_stage='default'):
@@ -47,5 +48,9 @@ def external_lib(app):
     #
     # client.on_message = on_mesage
 
-    # socketio
-    socketio.init_app(app)
+    # socketio, with the queue shared by the servers
+    socketio.init_app(app, **socketio_options(
+        app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL']))
+
+    # readings storage
+    storage.init_app(app)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Alert rules
+
+The alert rules are evaluated on each station reading as it
+arrives. Every rule keeps a small state by station, so a reading
+costs O(1) by rule and the history is never scanned again.
+
+An alert fires when its condition starts to hold and not again
+until the condition clears, and never twice within the rule
+cooldown.
+"""
+
+import time
+from collections import namedtuple
+
+
+Alert = namedtuple("Alert", ["station_id", "rule", "value", "message", "at"])
+
+
+def _ratio(numerator, denominator):
+    def metric(data):
+        try:
+            return float(data[numerator]) / float(data[denominator])
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            return None
+    return metric
+
+
+# metrics computed from the reading, any other metric is a reading key
+METRICS = {
+    "productivity_ratio": _ratio("obtainable_productivity",
+                                 "potential_productivity"),
+    "stress_ratio": _ratio("etc", "eto"),
+}
+
+
+def metric_value(metric, data):
+    """The metric value of a reading, None when it is missing"""
+    if metric in METRICS:
+        return METRICS[metric](data)
+    value = data.get(metric)
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Rule(object):
+    """Alert rule
+
+    :param name: The rule name, unique in the engine
+    :param metric: The metric name
+    :param message: The alert message, formatted with the station,
+     value and rule names
+    :param cooldown: Min seconds between two alerts of a station
+
+    :type name: str
+    :type metric: str
+    :type message: str
+    :type cooldown: int or float
+    """
+
+    def __init__(self, name, metric, message, cooldown=3600):
+        self.name = name
+        self.metric = metric
+        self.message = message
+        self.cooldown = cooldown
+
+    def new_state(self):
+        return {}
+
+    def condition(self, state, value, now):
+        """Updates the rule state with a reading
+
+        :return: True when the alert condition holds
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def alert_value(self, state, value):
+        """The value reported in the alert"""
+        return value
+
+
+class ThresholdRule(Rule):
+    """Fires when the metric is below or above a limit"""
+
+    def __init__(self, name, metric, message, below=None, above=None,
+                 cooldown=3600):
+        Rule.__init__(self, name, metric, message, cooldown)
+        self.below = below
+        self.above = above
+
+    def outside(self, value):
+        return (self.below is not None and value < self.below) or \
+               (self.above is not None and value > self.above)
+
+    def condition(self, state, value, now):
+        return self.outside(value)
+
+
+class SustainedRule(ThresholdRule):
+    """Fires when the metric stays below or above a
+    limit for duration seconds"""
+
+    def __init__(self, name, metric, message, duration, below=None,
+                 above=None, cooldown=3600):
+        ThresholdRule.__init__(self, name, metric, message, below, above,
+                               cooldown)
+        self.duration = duration
+
+    def condition(self, state, value, now):
+        if not self.outside(value):
+            state.pop("since", None)
+            return False
+        since = state.setdefault("since", now)
+        return now - since >= self.duration
+
+
+class RateOfChangeRule(Rule):
+    """Fires when the metric changes faster than a rate
+
+    The rate is the metric change by hour since a reference
+    sample between window / 2 and window seconds old. Only the
+    reference and the next one are kept, not the whole window.
+    """
+
+    def __init__(self, name, metric, message, window, min_rate=None,
+                 max_rate=None, cooldown=3600):
+        Rule.__init__(self, name, metric, message, cooldown)
+        self.window = window
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+
+    def new_state(self):
+        return {"first": None, "next": None}
+
+    def condition(self, state, value, now):
+        if state["first"] is None or now - state["first"][0] > self.window:
+            # the next reference is the first sample of the second
+            # half of the window, or this one after a gap
+            following = state["next"]
+            if following is None or now - following[0] > self.window:
+                following = (now, value)
+            state["first"], state["next"] = following, None
+        if state["next"] is None and \
+                now - state["first"][0] >= self.window / 2.0:
+            state["next"] = (now, value)
+
+        first_at, first = state["first"]
+        if now - first_at <= 0:
+            return False
+        state["rate"] = rate = (value - first) * 3600.0 / (now - first_at)
+        return (self.min_rate is not None and rate < self.min_rate) or \
+               (self.max_rate is not None and rate > self.max_rate)
+
+    def alert_value(self, state, value):
+        return state["rate"]
+
+
+RULES = {"threshold": ThresholdRule,
+         "sustained": SustainedRule,
+         "rate": RateOfChangeRule}
+
+
+def rules_from_config(config):
+    """Builds the rules of a list of dicts with a type key,
+    threshold, sustained or rate, and the rule kwargs"""
+    rules = []
+    for rule in config:
+        rule = dict(rule)
+        rules.append(RULES[rule.pop("type")](**rule))
+    return rules
+
+
+class AlertEngine(object):
+    """Alert Engine
+
+    :param rules: The alert rules
+    :param notify: Function called with each alert message
+    """
+
+    def __init__(self, rules, notify=None):
+        self.rules = list(rules)
+        self.notify = notify
+        self._states = {}
+
+    def evaluate(self, data, now=None):
+        """Evaluate
+
+        Updates the rules of the reading station
+
+        :param data: The station reading with the model outputs
+        :param now: The reading timestamp (default=time.time())
+
+        :type data: dict
+        :type now: int or float
+
+        :return: The fired alerts
+        :rtype: list
+        """
+        if now is None:
+            now = time.time()
+        station_id = str(data.get("id"))
+        states = self._states.get(station_id)
+        if states is None:
+            states = self._states[station_id] = \
+                [{"rule": rule.new_state(), "active": False, "fired_at": None}
+                 for rule in self.rules]
+
+        alerts = []
+        for rule, state in zip(self.rules, states):
+            value = metric_value(rule.metric, data)
+            if value is None:
+                continue
+            if not rule.condition(state["rule"], value, now):
+                state["active"] = False
+                continue
+            if state["active"]:
+                continue
+            state["active"] = True
+            if state["fired_at"] is not None and \
+                    now - state["fired_at"] < rule.cooldown:
+                continue
+            state["fired_at"] = now
+            value = rule.alert_value(state["rule"], value)
+            alert = Alert(station_id, rule.name, value,
+                          rule.message.format(station=station_id,
+                                              value=value, rule=rule.name),
+                          now)
+            alerts.append(alert)
+            if self.notify is not None:
+                self.notify(alert.message)
+        return alerts
+
+    def forget(self, station_id):
+        """Drops the rules state of a station"""
+        self._states.pop(str(station_id), None)
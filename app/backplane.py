@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Socket.IO backplane
+
+Many Socket.IO server processes behind a load balancer share their
+emits, room changes and disconnects through a message queue, each
+process delivering them to its own dashboards. Flask-SocketIO takes
+redis:// and amqp:// queues as they are, the labmet://host:port
+queue is the small broker of this module, for tests and single
+host deployments without a redis server.
+
+The broker relays length-prefixed frames: the first frame of a
+connection is its role, "S" to subscribe or "P" to publish, followed
+by its channel, the next ones are sent to every subscriber of the
+channel, the publisher process included. The messages are pickled,
+so the broker must only be reachable by the servers. A subscriber
+that does not keep up is disconnected once max_buffer bytes wait for
+it, it reconnects, instead of the broker buffering without limit.
+
+The manager uses the sockets, sleep and lock of the server async
+mode, green ones under eventlet or gevent, so the servers need no
+monkey patching.
+"""
+
+import pickle
+import socket
+import struct
+import asyncio
+import threading
+
+try:
+    from socketio import PubSubManager
+except ImportError:
+    from socketio.pubsub_manager import PubSubManager
+
+SCHEME = "labmet://"
+DEFAULT_PORT = 6380
+
+_LENGTH = struct.Struct("!I")
+
+
+def _frame(payload):
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _async_modules(async_mode):
+    """The socket module and the lock class of an async mode"""
+    if async_mode == "eventlet":
+        from eventlet.green import socket as green_socket
+        from eventlet.semaphore import Semaphore
+        return green_socket, Semaphore
+    if async_mode == "gevent":
+        from gevent import socket as green_socket
+        from gevent.lock import Semaphore
+        return green_socket, Semaphore
+    return socket, threading.Lock
+
+
+def _parse_url(url):
+    host, _, port = url[len(SCHEME):].strip("/").partition(":")
+    return host or "localhost", int(port or DEFAULT_PORT)
+
+
+class BackplaneBroker(object):
+    """Backplane broker
+
+    :param host: The listen host
+    :param port: The listen port
+    :param max_buffer: Bytes buffered for a subscriber
+     before it is disconnected
+
+    :type host: str
+    :type port: int
+    :type max_buffer: int
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT,
+                 max_buffer=4 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._channels = {}
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client,
+                                                  self.host, self.port)
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    @staticmethod
+    async def _read_frame(reader):
+        size, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        return await reader.readexactly(size)
+
+    async def _client(self, reader, writer):
+        channel = None
+        try:
+            hello = await self._read_frame(reader)
+            channel = hello[1:].decode("utf-8")
+            subscribers = self._channels.setdefault(channel, set())
+            if hello[:1] == b"S":
+                subscribers.add(writer)
+            while True:
+                frame = _frame(await self._read_frame(reader))
+                self.received += 1
+                for subscriber in list(subscribers):
+                    if subscriber.transport.get_write_buffer_size() > \
+                            self.max_buffer:
+                        subscribers.discard(subscriber)
+                        subscriber.close()
+                        self.dropped += 1
+                        continue
+                    subscriber.write(frame)
+                    self.delivered += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if channel is not None:
+                self._channels[channel].discard(writer)
+            writer.close()
+
+
+class BackplaneManager(PubSubManager):
+    """Backplane manager
+
+    The Socket.IO client manager of a labmet:// queue
+
+    :param url: The broker url, labmet://host:port
+    :param channel: The channel shared by the servers
+    :param write_only: True for processes that only emit
+    :param reconnect_delay: Seconds between reconnect attempts
+
+    :type url: str
+    :type channel: str
+    :type write_only: bool
+    :type reconnect_delay: float
+    """
+
+    name = "labmet"
+
+    def __init__(self, url=SCHEME, channel="socketio", write_only=False,
+                 reconnect_delay=1.0):
+        self.address = _parse_url(url)
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._socket = socket
+        self._lock = threading.Lock()
+        super(BackplaneManager, self).__init__(channel=channel,
+                                               write_only=write_only)
+
+    def initialize(self):
+        # the server is only known here, before the listen task starts
+        self._socket, lock = _async_modules(self.server.async_mode)
+        self._lock = lock()
+        super(BackplaneManager, self).initialize()
+
+    def _connect(self, role):
+        sock = self._socket.create_connection(self.address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(_frame(role + self.channel.encode("utf-8")))
+        return sock
+
+    def _publish(self, data):
+        frame = _frame(pickle.dumps(data))
+        with self._lock:
+            for retry in (True, False):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect(b"P")
+                    self._sock.sendall(frame)
+                    return
+                except (socket.error, OSError):
+                    if self._sock is not None:
+                        self._sock.close()
+                        self._sock = None
+                    if not retry:
+                        raise
+
+    @staticmethod
+    def _read(sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise socket.error("backplane connection closed")
+            data += chunk
+        return data
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect(b"S")
+            except (socket.error, OSError):
+                self.server.sleep(self.reconnect_delay)
+                continue
+            try:
+                while True:
+                    size, = _LENGTH.unpack(self._read(sock, _LENGTH.size))
+                    yield pickle.loads(self._read(sock, size))
+            except (socket.error, OSError):
+                sock.close()
+                self.server.sleep(self.reconnect_delay)
+
+
+def socketio_options(url, channel="flask-socketio"):
+    """Socketio options
+
+    The Flask-SocketIO init_app options of a message queue url
+
+    :param url: The queue url, None for a single server
+    :param channel: The channel shared by the servers
+
+    :type url: str or None
+    :type channel: str
+
+    :rtype: dict
+    """
+    if not url:
+        return {}
+    if url.startswith(SCHEME):
+        return {"client_manager": BackplaneManager(url, channel=channel)}
+    return {"message_queue": url, "channel": channel}
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Station models checkpoint
+
+The state of every station model is saved to a small binary file,
+so a restarted worker goes on with the soil moisture and the last
+eto and etc of each station instead of starting them again at the
+awc. The file is a header and the columns of the stations:
+
+    header          "LMST", version uint16, stations uint32
+    soil_moisture   float64 by station
+    precipitation   float64 by station
+    eto             float64 by station
+    etc             float64 by station
+    last_seen       float64 by station
+    id length       uint16 by station
+    ids             utf-8 station ids, one after the other
+
+little-endian, with NaN for the None values. Each column is packed
+at once, and the file is written aside and renamed over the old
+one, so a crash never leaves half a checkpoint.
+"""
+
+import os
+import struct
+from itertools import accumulate
+
+MAGIC = b"LMST"
+VERSION = 2
+STATE_FIELDS = ("soil_moisture", "precipitation", "eto", "etc")
+
+_HEADER = struct.Struct("<4sHI")
+_NAN = float("nan")
+
+
+def dumps(states):
+    """Dumps
+
+    Packs the station states
+
+    :param states: (station id, AquaCropModel.get_state(),
+     last seen) tuples, as returned by AquaCropRegistry.states
+    :type states: list
+
+    :rtype: bytes
+    """
+    count = len(states)
+    keys = [str(station_id).encode("utf-8") for station_id, _, _ in states]
+    columns = [[_NAN if state[f] is None else state[f]
+                for _, state, _ in states] for f in STATE_FIELDS]
+    columns.append([last_seen for _, _, last_seen in states])
+
+    doubles = struct.Struct("<%dd" % count)
+    parts = [_HEADER.pack(MAGIC, VERSION, count)]
+    parts.extend(doubles.pack(*column) for column in columns)
+    parts.append(struct.pack("<%dH" % count, *[len(k) for k in keys]))
+    parts.extend(keys)
+    return b"".join(parts)
+
+
+def loads(data):
+    """Loads
+
+    Unpacks the station states packed by dumps
+
+    :param data: The packed states
+    :type data: bytes
+
+    :return: (station id, state, last seen) tuples
+    :rtype: list
+    """
+    try:
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version %d station checkpoint" % VERSION)
+
+        offset = _HEADER.size
+        doubles = struct.Struct("<%dd" % count)
+        columns = []
+        for _ in range(len(STATE_FIELDS) + 1):
+            columns.append(doubles.unpack_from(data, offset))
+            offset += doubles.size
+        lengths = struct.unpack_from("<%dH" % count, data, offset)
+        offset += 2 * count
+    except struct.error:
+        raise ValueError("Truncated station checkpoint")
+    if offset + sum(lengths) != len(data):
+        raise ValueError("Truncated station checkpoint")
+
+    ends = list(accumulate(lengths))
+    keys = [data[offset + end - length:offset + end].decode("utf-8")
+            for end, length in zip(ends, lengths)]
+    # NaN is the only value not equal to itself
+    soil_moisture, precipitation, eto, etc, last_seen = [
+        [v if v == v else None for v in column] for column in columns]
+    states = [{"soil_moisture": values[0], "precipitation": values[1],
+               "eto": values[2], "etc": values[3]}
+              for values in zip(soil_moisture, precipitation, eto, etc)]
+    return list(zip(keys, states, last_seen))
+
+
+def save_states(registry, path):
+    """Writes the registry states, replacing the file atomically
+
+    :return: The number of stations saved
+    :rtype: int
+    """
+    states = registry.states()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(dumps(states))
+        f.flush()
+        os.fsync(f.fileno())
+    getattr(os, "replace", os.rename)(tmp_path, path)  # py2 os.rename
+    return len(states)
+
+
+def load_states(registry, path):
+    """Loads the states of a checkpoint file into the registry
+
+    :return: The number of stations loaded, 0 without a file
+    :rtype: int
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        states = loads(f.read())
+    registry.load_states(states)
+    return len(states)
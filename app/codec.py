@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Wire formats
+
+The station payloads and the Socket.IO frames can be JSON,
+MessagePack or CBOR. JSON is always available, msgpack and cbor2
+are optional and a missing one falls back to JSON. The formats are
+told apart by their first byte, a JSON object starts with "{", a
+MessagePack map with 0x80-0x8f, 0xde or 0xdf and a CBOR map with
+0xa0-0xbb or 0xbf, so the receivers decode any of them and only
+the senders choose one.
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class Codec(object):
+    """Codec
+
+    :param name: The format name
+    :param dumps: Function that encodes an object
+    :param loads: Function that decodes bytes
+    :param binary: True when the encoded data are bytes, not str
+
+    :type name: str
+    :type dumps: callable
+    :type loads: callable
+    :type binary: bool
+    """
+
+    def __init__(self, name, dumps, loads, binary=True):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.binary = binary
+
+    def __repr__(self):
+        return "Codec(%r)" % self.name
+
+
+def _json_loads(data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+FORMATS = ("json", "msgpack", "cbor")
+
+codecs = {"json": Codec("json", json.dumps, _json_loads, binary=False)}
+if msgpack is not None:
+    codecs["msgpack"] = Codec(
+        "msgpack", lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False))
+if cbor2 is not None:
+    codecs["cbor"] = Codec("cbor", cbor2.dumps, cbor2.loads)
+
+
+def get_codec(name):
+    """Get codec
+
+    The codec of a format, JSON when the format
+    library is not installed
+
+    :param name: One of FORMATS
+    :type name: str
+
+    :rtype: Codec
+    """
+    if name not in FORMATS:
+        raise ValueError("Format %r not available, use one of: %s" %
+                         (name, ", ".join(FORMATS)))
+    if name not in codecs:
+        print("Warning: %s is not installed, using json" % name)
+        return codecs["json"]
+    return codecs[name]
+
+
+def detect(data):
+    """The codec of an encoded object, by its first byte"""
+    if isinstance(data, str):
+        return codecs["json"]
+    first = bytearray(data[:1])
+    first = first[0] if first else 0
+    if 0x80 <= first <= 0x8f or first in (0xde, 0xdf):
+        name = "msgpack"
+    elif 0xa0 <= first <= 0xbb or first == 0xbf:
+        name = "cbor"
+    else:
+        return codecs["json"]
+    if name not in codecs:
+        raise ValueError("The payload is %s, which is not installed" % name)
+    return codecs[name]
+
+
+def decode(data):
+    """Decodes a JSON, MessagePack or CBOR payload"""
+    return detect(data).loads(data)
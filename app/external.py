@@ -1,6 +1,8 @@
 # import paho.mqtt.client as mqtt
 from flask_socketio import SocketIO
 from labmet.fao_aquacrop_model.prodfao import AquaCropModel
+from app.registry import AquaCropRegistry
+from app.storage import FlaskStorage
 
 aquacrop_data = {"culture_name": "potato",
                  "ky": 1.1,
@@ -12,5 +14,7 @@ aquacrop_data = {"culture_name": "potato",
                  "awc": 35}
 
 aqua_crop_model = AquaCropModel(**aquacrop_data)
+aqua_crop_registry = AquaCropRegistry(aquacrop_data)
 socketio = SocketIO()
+storage = FlaskStorage()
 # client = mqtt.Client()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Ingestion pipeline
+
+Station readings go through three stages connected by bounded queues:
+the MQTT consumer feeds the raw payloads, the compute stage runs the
+station AquaCrop model and the publishers send the enriched readings.
+A full queue holds the stage before it, down to the MQTT socket reads,
+so a slow publisher never makes the worker buffer without limit.
+"""
+
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from app.codec import decode
+from app.metrics import stamp
+
+
+def process_payload(registry, payload):
+    """Process payload
+
+    Runs one station reading through its AquaCrop model
+
+    :param registry: The station models registry
+    :param payload: The MQTT message payload, JSON, MessagePack or CBOR
+
+    :type registry: AquaCropRegistry
+    :type payload: bytes
+
+    :return: The reading updated with the model outputs
+    :rtype: dict
+    """
+    return process_reading(registry, decode(payload))
+
+
+def process_reading(registry, data):
+    """Process reading
+
+    Runs one decoded station reading through its AquaCrop model
+
+    :param registry: The station models registry
+    :param data: The station reading
+
+    :type registry: AquaCropRegistry
+    :type data: dict
+
+    :return: The reading updated with the model outputs
+    :rtype: dict
+    """
+    productivity_values_data = {"soil_moisture": data["analog_soil_moisture"],
+                                "temperature": data["ds18b20_temp"],
+                                "illuminance": data["bh1750_illuminance"],
+                                "date": datetime.now()
+                                }
+
+    aqua_crop_model = registry.get(data.get("id"))
+    stamp(data, "aqua_crop_start")
+    data.update(aqua_crop_model.aqua_crop(**productivity_values_data))
+    stamp(data, "aqua_crop_end")
+    data["soil_moisture_mm"] = aqua_crop_model.soil_moisture
+    return data
+
+
+class IngestionPipeline(object):
+    """Ingestion Pipeline
+
+    :param process: Function that turns a payload into the enriched data,
+     or None for a payload that is not published
+    :param publish: Coroutine function called with the publisher
+     index and the enriched data
+    :param queue_size: Size of the inbound and of each publisher queue
+    :param publishers: Number of concurrent publishers, the readings of
+     a station always go through the same publisher to keep their order
+
+    :type process: callable
+    :type publish: callable
+    :type queue_size: int
+    :type publishers: int
+    """
+
+    def __init__(self, process, publish, queue_size=1024, publishers=1):
+        self.process = process
+        self.publish = publish
+        self.queue_size = queue_size
+        self.inbound = asyncio.Queue(maxsize=queue_size)
+        self.outbound = [asyncio.Queue(maxsize=queue_size)
+                         for _ in range(publishers)]
+        self.on_pause = None
+        self.on_resume = None
+        self.paused = False
+        self.received = 0
+        self.published = 0
+        self.errors = 0
+        self._overflow = deque()
+
+    def feed(self, payload):
+        """Feed
+
+        Enqueues a raw payload, pausing the producer
+        when the inbound queue becomes full
+
+        :param payload: The MQTT message payload
+        :type payload: bytes
+        """
+        self.received += 1
+        item = (time.time(), payload)
+        if self.inbound.full():
+            self._overflow.append(item)
+        else:
+            self.inbound.put_nowait(item)
+
+        if self.inbound.full() and not self.paused:
+            self.paused = True
+            if self.on_pause is not None:
+                self.on_pause()
+
+    def _refill(self):
+        while self._overflow and not self.inbound.full():
+            self.inbound.put_nowait(self._overflow.popleft())
+
+        if self.paused and not self._overflow and \
+                self.inbound.qsize() <= self.queue_size // 2:
+            self.paused = False
+            if self.on_resume is not None:
+                self.on_resume()
+
+    def shard(self, data):
+        """Publisher index of the reading station"""
+        return hash(str(data.get("id"))) % len(self.outbound)
+
+    async def _compute(self):
+        while True:
+            received, payload = await self.inbound.get()
+            self._refill()
+            try:
+                data = self.process(payload)
+            except Exception as e:
+                self.errors += 1
+                print("Error: %s" % e)
+                continue
+            if data is None:
+                continue
+            stamp(data, "received", received)
+            await self.outbound[self.shard(data)].put(data)
+
+    async def _publisher(self, index):
+        queue = self.outbound[index]
+        while True:
+            data = await queue.get()
+            try:
+                await self.publish(index, data)
+                self.published += 1
+            except Exception as e:
+                self.errors += 1
+                print("Error: %s" % e)
+
+    async def stats(self, interval):
+        """Prints the pipeline throughput every interval seconds"""
+        last = 0
+        while True:
+            await asyncio.sleep(interval)
+            print("received %d published %d errors %d (%.1f msg/s)" %
+                  (self.received, self.published, self.errors,
+                   (self.published - last) / interval))
+            last = self.published
+
+    def tasks(self):
+        """The compute and publishers tasks"""
+        tasks = [asyncio.ensure_future(self._compute())]
+        tasks.extend(asyncio.ensure_future(self._publisher(i))
+                     for i in range(len(self.outbound)))
+        return tasks
+
+
+class AsyncMQTTConsumer(object):
+    """Async MQTT Consumer
+
+    Drives a connected paho client from the asyncio event loop,
+    reading the socket only when it is readable and feeding every
+    message to the pipeline.
+
+    :param client: A connected paho client
+    :param pipeline: The ingestion pipeline
+    :param loop: The event loop, default the one running run
+
+    :type client: paho.mqtt.client.Client
+    :type pipeline: IngestionPipeline
+    :type loop: asyncio.AbstractEventLoop
+    """
+
+    def __init__(self, client, pipeline, misc_interval=0.1, loop=None):
+        self.client = client
+        self.pipeline = pipeline
+        self.misc_interval = misc_interval
+        self.loop = loop
+        self.sock = None
+        self._fd = None
+
+        self.client.on_message = self.on_message
+        self.pipeline.on_pause = self.pause
+        self.pipeline.on_resume = self.resume
+
+    def on_message(self, client, userdata, msg):
+        self.pipeline.feed(msg.payload)
+
+    def _read(self):
+        if self.client.loop_read() != mqtt.MQTT_ERR_SUCCESS:
+            self.pause()
+
+    def pause(self):
+        """Stops reading the broker socket"""
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
+
+    def resume(self):
+        """Reads the broker socket again"""
+        if self.sock is not None and self._fd is None and \
+                not self.pipeline.paused:
+            self._fd = self.sock.fileno()
+            self.loop.add_reader(self._fd, self._read)
+
+    async def run(self):
+        """Keeps the client connection, pings and reconnects"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        self.sock = self.client.socket()
+        self.resume()
+        while True:
+            if self.client.want_write():
+                self.client.loop_write()
+            if self.client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                self.pause()
+                self.sock = None
+                try:
+                    # the connect blocks, up to the TCP timeout
+                    await self.loop.run_in_executor(None,
+                                                    self.client.reconnect)
+                    self.sock = self.client.socket()
+                    self.resume()
+                except (OSError, IOError) as e:
+                    print("Error: %s" % e)
+            await asyncio.sleep(self.misc_interval)
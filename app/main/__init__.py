@@ -6,4 +6,4 @@ from flask import Blueprint
 main = Blueprint('main', __name__)
 
 from . import views
-from .events import station_receive
+from .events import station_receive, station_update
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Station data broadcast
+
+The station updates are coalesced for a short window and sent to
+the dashboards as one frame by station room, serialized only once
+per room and window. Dashboards join the rooms of the stations
+they show, so they only receive those.
+"""
+
+import time
+import threading
+
+from app.codec import get_codec
+from app.metrics import TIMING_KEY
+
+
+def station_room(station_id):
+    """The Socket.IO room name of a station"""
+    return 'station-%s' % station_id
+
+
+class StationBroadcaster(object):
+    """Station Broadcaster
+
+    :param socketio: The Flask-SocketIO instance
+    :param window: Seconds the updates are collected before the emit
+    :param event: The Socket.IO event name
+    :param namespace: The Socket.IO namespace
+    :param metrics: Latency metrics of the emitted updates
+    :param codec: The frames wire format, default JSON
+
+    :type socketio: flask_socketio.SocketIO
+    :type window: float
+    :type event: str
+    :type namespace: str
+    :type metrics: app.metrics.LatencyMetrics
+    :type codec: app.codec.Codec
+    """
+
+    def __init__(self, socketio, window=0.25, event='station_batch',
+                 namespace='/weather_data', metrics=None, codec=None):
+        self.socketio = socketio
+        self.metrics = metrics
+        self.codec = codec or get_codec('json')
+        self.window = window
+        self.event = event
+        self.namespace = namespace
+        self.errors = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._task = None
+
+    def push(self, data):
+        """Push
+
+        Adds a station update to the next frame
+
+        :param data: The station reading with the model outputs
+        :type data: dict
+        """
+        room = station_room(data.get('id'))
+        with self._lock:
+            self._pending.setdefault(room, []).append(data)
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self.run)
+
+    def flush(self):
+        """Flush
+
+        Emits the collected updates of each station room
+        as one pre-serialized frame
+
+        :return: The number of updates sent
+        :rtype: int
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, updates in pending.items():
+            # the stage timestamps are not sent to the dashboards
+            timings = [update.pop(TIMING_KEY, None) for update in updates]
+            emitted_at = time.time()
+            self.socketio.emit(self.event, self.codec.dumps(updates),
+                               namespace=self.namespace, room=room)
+            if self.metrics is not None:
+                for update, timing in zip(updates, timings):
+                    if timing is not None:
+                        timing["server_emit"] = emitted_at
+                        self.metrics.record(update, timing)
+        return sum(len(updates) for updates in pending.values())
+
+    def run(self):
+        while True:
+            self.socketio.sleep(self.window)
+            # an encode or emit error drops that frame, not the task
+            try:
+                self.flush()
+            except Exception as e:
+                self.errors += 1
+                print("Error: %s" % e)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Series downsampling
+
+Reduces the station series to a number of points the
+dashboard plots can draw, keeping the series shape.
+"""
+
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """Largest triangle three buckets
+
+    Selects the points of a series that keep its visual shape
+    (Steinarsson, 2013).
+
+    :param x: The series x values, in increasing order
+    :param y: The series y values
+    :param threshold: The number of points to keep
+
+    :type x: numpy.ndarray
+    :type y: numpy.ndarray
+    :type threshold: int
+
+    :return: The indexes of the selected points, only the first
+     and last ones below 3 points
+    :rtype: numpy.ndarray
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(1, threshold)], dtype=np.intp)
+
+    y = np.where(np.isnan(y), 0.0, y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def bucket_aggregate(x, values, buckets):
+    """Bucket aggregate
+
+    Splits the series in buckets with the same number of
+    points and computes the minimum, maximum and mean of
+    each column in every bucket.
+
+    :param x: The series x values
+    :param values: The series columns, shaped (points, columns)
+    :param buckets: The number of buckets
+
+    :type x: numpy.ndarray
+    :type values: numpy.ndarray
+    :type buckets: int
+
+    :return: The mean x and the min, max and mean columns of each bucket
+    :rtype: dict
+    """
+    n = len(x)
+    buckets = max(1, min(buckets, n))
+    starts = np.linspace(0, n, buckets, endpoint=False).astype(np.intp)
+    counts = np.diff(np.append(starts, n))
+
+    with np.errstate(invalid='ignore'):
+        return {"x": np.add.reduceat(x, starts) / counts,
+                "min": np.fmin.reduceat(values, starts, axis=0),
+                "max": np.fmax.reduceat(values, starts, axis=0),
+                "mean": np.add.reduceat(values, starts, axis=0) /
+                counts[:, None]}
@@ -1,16 +1,66 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import json
+from flask import request
+from flask_socketio import join_room, leave_room, rooms
 
 from config import Config
+from app.alerts import AlertEngine, rules_from_config
+from app.codec import decode, get_codec
 from app.external import socketio
-from app.main.notification import Notification
+from app.metrics import LatencyMetrics, stamp
+from app.main.broadcast import StationBroadcaster, station_room
+from app.main.notification import Notification, NotificationDispatcher
 
 
-notification = Notification(Config.NOTIFICATIONKEY)  # o.0
+notification = Notification(Config.NOTIFICATIONKEY,
+                            base_url=Config.NOTIFICATION_URL)
+notifications = NotificationDispatcher(notification)
+alerts = AlertEngine(rules_from_config(Config.ALERT_RULES),
+                     notify=notifications.send)
+latency = LatencyMetrics(max_stations=Config.METRICS_MAX_STATIONS)
+broadcaster = StationBroadcaster(socketio, window=Config.STATION_BATCH_WINDOW,
+                                 metrics=latency,
+                                 codec=get_codec(Config.BROADCAST_FORMAT))
 
 
 @socketio.on('stations')
-def station_receive(json_data):
-    socketio.emit('station_data', json.loads(json_data),
-                  namespace='/weather_data')
+def station_receive(payload):
+    station_update(decode(payload))
+
+
+def station_update(data):
+    """Alerts and broadcasts a reading enriched by the worker
+    or by the in-process MQTTIngestion"""
+    stamp(data, "server_receive")
+    alerts.evaluate(data)
+    broadcaster.push(data)
+
+
+def _station_ids(message):
+    """The station ids of a subscribe message, none when malformed"""
+    ids = message.get('ids') if isinstance(message, dict) else None
+    if not isinstance(ids, list):
+        return []
+    return [_id for _id in ids if isinstance(_id, (str, int)) and
+            not isinstance(_id, bool)]
+
+
+@socketio.on('subscribe', namespace='/weather_data')
+def subscribe(message):
+    """joins the rooms of the dashboard station ids, up to
+    MAX_SUBSCRIPTIONS rooms by dashboard over all its calls"""
+    joined = set(room for room in rooms() if room != request.sid)
+    for _id in _station_ids(message):
+        room = station_room(_id)
+        if room in joined:
+            continue
+        if len(joined) >= Config.MAX_SUBSCRIPTIONS:
+            break
+        join_room(room)
+        joined.add(room)
+
+
+@socketio.on('unsubscribe', namespace='/weather_data')
+def unsubscribe(message):
+    for _id in _station_ids(message):
+        leave_room(station_room(_id))
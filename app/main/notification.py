@@ -4,33 +4,56 @@ labmet
 """
 
 import os
-import json
+import time
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:  # py2
+    from Queue import Queue, Empty, Full
 
 
 class NotificationNotAuth(Exception):
     pass
 
 
+class NotificationError(Exception):
+    pass
+
+
 class Notification:
 
-    def __init__(self, apikey, profile='labmet'):
+    def __init__(self, apikey, profile='labmet',
+                 base_url='https://api.ionic.io', token_ttl=3600,
+                 timeout=10, pool_size=4):
         # TODO: Change this
         self.apikey = apikey
         self.profile = profile
-        self.base_url = 'https://api.ionic.io'
+        self.base_url = base_url
+        self.token_ttl = token_ttl
+        self.timeout = timeout
+        self.tokens = []
+        self._tokens_at = None
+        self._lock = threading.Lock()
+
+        # persistent pooled connections, no request is done here
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1,
+                                                      pool_maxsize=pool_size))
 
         if apikey is not None:
             self.headers = {}
             self.headers['Content-Type'] = 'application/json'
             self.headers['Authorization'] = 'Bearer ' + self.apikey
-            self.tokens = []
-            self.get_tokens()
+            self.session.headers.update(self.headers)
 
     def test_auth(self):
         """testing if auth correct"""
         url = self.base_url + "/auth/test"
-        response = requests.get(url, headers=self.headers).json()
+        response = self.session.get(url, timeout=self.timeout).json()
 
         try:
             assert response['meta']['status'] == 200
@@ -39,38 +62,155 @@ class Notification:
 
         return True
 
-    def get_tokens(self):
-        """return mobile token"""
+    def get_tokens(self, refresh=False):
+        """return mobile token
+
+        The tokens are fetched on the first call and
+        kept for token_ttl seconds
+        """
         url = self.base_url + '/push/tokens'
 
-        if len(self.tokens) == 0:
-            response = requests.get(url, headers=self.headers).json()
-            assert response['meta']['status'] == 200
-            if len(response['data']) > 0:
-                self.tokens = [d['token'].encode(
-                    'iso-8859-15') for d in response['data']]
+        with self._lock:
+            expired = self._tokens_at is None or \
+                time.time() - self._tokens_at > self.token_ttl
+            if refresh or expired:
+                response = self.session.get(url, timeout=self.timeout).json()
+                if response['meta']['status'] != 200:
+                    raise NotificationError('tokens status %s' %
+                                            response['meta']['status'])
+                self.tokens = [d['token'] for d in response['data']]
+                self._tokens_at = time.time()
         return self.tokens
 
     def send_push_all(self, msg):
-        # TODO: Async func
+        """Pushes the message to every token
+
+        :return: False when there is no api key or no token,
+         nobody received the message
+        :rtype: bool
+        """
         if not self.apikey:
-            return
+            return False
         url = self.base_url + '/push/notifications'
-        if len(self.tokens) > 0:
+        tokens = self.get_tokens()
+        if len(tokens) > 0:
 
             data = {
-                "tokens": self.tokens,
+                "tokens": tokens,
                 "profile": self.profile,
                 "notification": {
                     "message": msg
                 }
             }
-            response = requests.post(url, json=data,
-                                     headers=self.headers).json()
-            assert response['meta']['status'] == 201
+            response = self.session.post(url, json=data,
+                                         timeout=self.timeout).json()
+            if response['meta']['status'] != 201:
+                raise NotificationError('push status %s' %
+                                        response['meta']['status'])
             return True
         else:
             print("No tokens")
+            return False
+
+
+class NotificationDispatcher(object):
+    """Notification Dispatcher
+
+    Sends the alerts from a background thread, so an alert
+    never blocks the Socket.IO event loop. The alerts queued
+    within batch_window seconds are sent as one push, failed
+    pushes are retried with exponential backoff.
+
+    :param notification: The notification client
+    :param batch_window: Seconds to collect alerts for one push
+    :param max_batch: Max alerts in one push
+    :param retries: Retries of a failed push
+    :param backoff: Seconds before the first retry, doubled each retry
+    :param queue_size: Max alerts waiting, new alerts are dropped when full
+    """
+
+    def __init__(self, notification, batch_window=1.0, max_batch=20,
+                 retries=3, backoff=1.0, queue_size=1000):
+        self.notification = notification
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = Queue(maxsize=queue_size)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, msg):
+        """Queues an alert message, never blocks
+
+        :return: False when the alert was dropped
+        :rtype: bool
+        """
+        if not self.notification.apikey:
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait(msg)
+        except Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run,
+                                                name='notification')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.batch_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+        # repeated alerts are sent once
+        unique = []
+        for msg in batch:
+            if msg not in unique:
+                unique.append(msg)
+        return unique
+
+    def dispatch(self, messages):
+        """Sends the messages as one push, retrying on errors
+
+        :return: True when the push was sent
+        :rtype: bool
+        """
+        msg = "\n".join(messages)
+        for attempt in range(self.retries + 1):
+            try:
+                if not self.notification.send_push_all(msg):
+                    # no recipient, a retry would not deliver it
+                    self.dropped += len(messages)
+                    return False
+                self.sent += len(messages)
+                return True
+            except (requests.RequestException, NotificationError,
+                    ValueError, KeyError) as e:
+                print("Notification error: %s" % e)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        self.failed += len(messages)
+        return False
+
+    def run(self):
+        while True:
+            self.dispatch(self._batch())
 
 
 def main():
@@ -1,8 +1,97 @@
-from flask import render_template
+import numpy as np
+from flask import (render_template, request, jsonify, abort, current_app,
+                   Response)
 
 from . import main
+from .downsampling import lttb, bucket_aggregate
+from .events import latency
+from app.external import storage
+from app.storage import parse_collected_at, READING_FIELDS, OUTPUT_FIELDS
 
 
 @main.route('/')
 def index():
     return render_template('index.html')
+
+
+def _time_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return parse_collected_at(float(value))
+    except ValueError:
+        pass
+    try:
+        return parse_collected_at(value)
+    except ValueError:
+        abort(400)
+
+
+def _json_column(values):
+    """numpy column to a json list, NaN as null"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _series(station_id, rows, fields, default_field):
+    """Downsampled series response
+
+    Query args:
+        points: The number of points, default and max HISTORY_MAX_POINTS,
+         min 3
+        method: lttb (default), minmax or mean
+        field: The field the lttb method follows
+    """
+    max_points = current_app.config['HISTORY_MAX_POINTS']
+    points = request.args.get('points', max_points, type=int)
+    points = max(3, min(points, max_points))
+    method = request.args.get('method', 'lttb')
+    field = request.args.get('field', default_field)
+    if method not in ('lttb', 'minmax', 'mean') or field not in fields:
+        abort(400)
+
+    series = np.array(rows, dtype=np.float64).reshape(-1, len(fields) + 1)
+    collected_at, values = series[:, 0], series[:, 1:]
+    data = {}
+
+    if method == 'lttb' or len(rows) <= points:
+        selected = lttb(collected_at, values[:, fields.index(field)], points)
+        data["collected_at"] = _json_column(collected_at[selected])
+        for i, name in enumerate(fields):
+            data[name] = _json_column(values[selected, i])
+    else:
+        aggregate = bucket_aggregate(collected_at, values, points)
+        data["collected_at"] = _json_column(aggregate["x"])
+        for i, name in enumerate(fields):
+            data[name] = _json_column(aggregate["mean"][:, i])
+            if method == 'minmax':
+                data[name + "_min"] = _json_column(aggregate["min"][:, i])
+                data[name + "_max"] = _json_column(aggregate["max"][:, i])
+
+    return jsonify(station_id=station_id,
+                   method=method,
+                   raw_points=len(rows),
+                   points=len(data["collected_at"]),
+                   data=data)
+
+
+@main.route('/stations/<station_id>/readings')
+def station_readings(station_id):
+    """station raw readings between start and end"""
+    rows = storage.readings(station_id, _time_arg('start'), _time_arg('end'))
+    return _series(station_id, rows, list(READING_FIELDS), "ds18b20_temp")
+
+
+@main.route('/stations/<station_id>/productivity')
+def station_productivity(station_id):
+    """station model outputs between start and end"""
+    rows = storage.outputs(station_id, _time_arg('start'), _time_arg('end'))
+    return _series(station_id, rows, list(OUTPUT_FIELDS),
+                   "obtainable_productivity")
+
+
+@main.route('/metrics')
+def metrics():
+    """stage latency histograms in the Prometheus text format"""
+    return Response(latency.prometheus(),
+                    mimetype='text/plain; version=0.0.4')
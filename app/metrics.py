@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Latency metrics
+
+Each reading carries the timestamps of the stages it went through,
+from the MQTT receive in the worker to the emit to the dashboards,
+in its TIMING_KEY dict. The server turns them into the latency of
+each stage, recorded in HDR style histograms by stage and station,
+and exposes them in the Prometheus text format.
+"""
+
+import math
+import time
+import threading
+
+from app.storage import parse_collected_at
+
+TIMING_KEY = "_timing"
+
+# stage name, first stamp, last stamp
+STAGES = (
+    ("mqtt", "collected", "received"),
+    ("decode", "received", "aqua_crop_start"),
+    ("aqua_crop", "aqua_crop_start", "aqua_crop_end"),
+    ("publish", "aqua_crop_end", "client_emit"),
+    ("transport", "client_emit", "server_receive"),
+    ("broadcast", "server_receive", "server_emit"),
+    ("end_to_end", "received", "server_emit"),
+)
+
+# prometheus buckets upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def stamp(data, name, at=None):
+    """Stamps a stage timestamp in the reading, default now"""
+    data.setdefault(TIMING_KEY, {})[name] = time.time() if at is None else at
+
+
+def _collected_at(data):
+    # the station clocks are in UTC, as the storage reads them
+    if data.get("collected_at") is None:
+        return None
+    try:
+        return parse_collected_at(data["collected_at"])
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyHistogram(object):
+    """HDR style latency histogram
+
+    The values are counted in microseconds in log-linear buckets:
+    2 ** sub_bits linear buckets for each power of two, so every
+    value is kept with a relative error below 2 ** (1 - sub_bits),
+    at any magnitude and with a constant cost by record.
+
+    :param sub_bits: Bits of the linear buckets
+    :type sub_bits: int
+    """
+
+    def __init__(self, sub_bits=7):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, micros):
+        exponent = max(0, micros.bit_length() - self.sub_bits)
+        return exponent * self.half + (micros >> exponent)
+
+    def _highest(self, index):
+        """The highest microseconds counted in the bucket"""
+        exponent = max(0, index // self.half - 1)
+        return ((index - exponent * self.half + 1) << exponent) - 1
+
+    def record(self, seconds):
+        """Records a latency, negative ones as 0"""
+        seconds = max(0.0, seconds)
+        index = self._index(int(seconds * 1e6))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """The latency in seconds below which are p percent of the values"""
+        if not self.count:
+            return float("nan")
+        rank = max(1, int(math.ceil(self.count * p / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest(index) / 1e6, self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """The number of values below or equal to each bound in seconds"""
+        counts = [0] * len(bounds)
+        for index, count in self.counts.items():
+            # a bucket is below a bound only when all its values are
+            highest = self._highest(index) / 1e6
+            for i, bound in enumerate(bounds):
+                if highest <= bound:
+                    counts[i] += count
+        return counts
+
+
+def _labels(**labels):
+    return ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\")
+                                         .replace('"', '\\"'))
+                    for k, v in sorted(labels.items()))
+
+
+class LatencyMetrics(object):
+    """Latency Metrics
+
+    :param max_stations: Max stations with their own histograms,
+     the readings of the others only count in the stage totals
+    :type max_stations: int
+    """
+
+    def __init__(self, max_stations=100):
+        self.max_stations = max_stations
+        self.stages = dict((stage, LatencyHistogram())
+                           for stage, _, _ in STAGES)
+        self.stations = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, station_id, seconds):
+        """Records the latency of a stage"""
+        with self._lock:
+            self.stages[stage].record(seconds)
+            station = self.stations.get(station_id)
+            if station is None:
+                if len(self.stations) >= self.max_stations:
+                    return
+                station = self.stations[station_id] = {}
+            histogram = station.get(stage)
+            if histogram is None:
+                histogram = station[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record(self, data, timing=None):
+        """Records the latency of each stage stamped in the reading
+
+        :param data: The station reading
+        :param timing: The reading stamps, default the TIMING_KEY of data
+        """
+        if timing is None:
+            timing = data.get(TIMING_KEY)
+        if not timing:
+            return
+        timing = dict(timing)
+        collected = _collected_at(data)
+        if collected is not None:
+            timing["collected"] = collected
+
+        station_id = str(data.get("id"))
+        for stage, first, last in STAGES:
+            if first in timing and last in timing:
+                self.observe(stage, station_id, timing[last] - timing[first])
+
+    def _histogram(self, lines, name, histogram, **labels):
+        label = _labels(**labels)
+        for bound, count in zip(BUCKETS, histogram.cumulative(BUCKETS)):
+            lines.append('%s_bucket{%s,le="%s"} %d' %
+                         (name, label, repr(bound), count))
+        lines.append('%s_bucket{%s,le="+Inf"} %d' %
+                     (name, label, histogram.count))
+        lines.append('%s_sum{%s} %r' % (name, label, histogram.sum))
+        lines.append('%s_count{%s} %d' % (name, label, histogram.count))
+
+    def prometheus(self):
+        """The histograms in the Prometheus text format
+
+        :rtype: str
+        """
+        lines = []
+        with self._lock:
+            lines.append("# HELP labmet_stage_latency_seconds "
+                         "Latency of each ingestion stage")
+            lines.append("# TYPE labmet_stage_latency_seconds histogram")
+            for stage, _, _ in STAGES:
+                self._histogram(lines, "labmet_stage_latency_seconds",
+                                self.stages[stage], stage=stage)
+
+            lines.append("# HELP labmet_stage_latency_quantile_seconds "
+                         "Latency quantiles of each ingestion stage")
+            lines.append("# TYPE labmet_stage_latency_quantile_seconds gauge")
+            for stage, _, _ in STAGES:
+                histogram = self.stages[stage]
+                if not histogram.count:
+                    continue
+                for q in QUANTILES:
+                    lines.append(
+                        "labmet_stage_latency_quantile_seconds{%s} %r" %
+                        (_labels(stage=stage, quantile=q),
+                         histogram.percentile(q * 100)))
+
+            lines.append("# HELP labmet_station_stage_latency_seconds "
+                         "Latency of each ingestion stage by station")
+            lines.append("# TYPE labmet_station_stage_latency_seconds "
+                         "histogram")
+            for station_id in sorted(self.stations):
+                for stage, _, _ in STAGES:
+                    histogram = self.stations[station_id].get(stage)
+                    if histogram is not None:
+                        self._histogram(lines,
+                                        "labmet_station_stage_latency_seconds",
+                                        histogram, stage=stage,
+                                        station=station_id)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""MQTT broker stub
+
+A minimal in-process MQTT 3.1.1 broker for capacity tests, so the
+station simulator and the worker can run without a real broker.
+Every client is accepted, the messages are delivered with QoS 0
+and the last retained message of each topic is kept. Like the QoS 0
+of a real broker, the messages of a subscriber that does not keep up
+are dropped once max_buffer bytes wait for it.
+"""
+
+import struct
+import asyncio
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def topic_matches(subscription, topic):
+    """True when the topic matches the subscription
+    filter, with the + and # wildcards"""
+    filters = subscription.split("/")
+    levels = topic.split("/")
+    for i, part in enumerate(filters):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(filters) == len(levels)
+
+
+def _packet(packet_type, flags, body):
+    header = bytearray([packet_type << 4 | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(header) + body
+
+
+def _publish_packet(topic, payload, retain=False):
+    name = topic.encode("utf-8")
+    return _packet(PUBLISH, 1 if retain else 0,
+                   struct.pack("!H", len(name)) + name + payload)
+
+
+def _string(data, offset):
+    size, = struct.unpack_from("!H", data, offset)
+    return data[offset + 2:offset + 2 + size], offset + 2 + size
+
+
+class MQTTBrokerStub(object):
+    """MQTT broker stub
+
+    :param host: The listen host
+    :param port: The listen port
+    :param max_buffer: Bytes buffered for a subscriber
+     before its messages are dropped
+
+    :type host: str
+    :type port: int
+    :type max_buffer: int
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883,
+                 max_buffer=4 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._subscriptions = {}
+        self._retained = {}
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client,
+                                                  self.host, self.port)
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def publish(self, topic, payload, retain=False):
+        """Delivers a message to the matching subscribers"""
+        if retain:
+            if payload:
+                self._retained[topic] = payload
+            else:
+                self._retained.pop(topic, None)
+        packet = None
+        for writer, filters in list(self._subscriptions.items()):
+            if any(topic_matches(f, topic) for f in filters):
+                if writer.transport.get_write_buffer_size() > \
+                        self.max_buffer:
+                    self.dropped += 1
+                    continue
+                if packet is None:
+                    packet = _publish_packet(topic, payload)
+                writer.write(packet)
+                self.delivered += 1
+
+    async def _read_packet(self, reader):
+        first = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7f) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(length) if length else b""
+        return first >> 4, first & 0x0f, body
+
+    async def _client(self, reader, writer):
+        filters = self._subscriptions[writer] = set()
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet(reader)
+                if packet_type == CONNECT:
+                    writer.write(_packet(CONNACK, 0, b"\x00\x00"))
+                elif packet_type == PUBLISH:
+                    topic, offset = _string(body, 0)
+                    qos = flags >> 1 & 0x03
+                    if qos:
+                        writer.write(_packet(PUBACK, 0,
+                                             body[offset:offset + 2]))
+                        offset += 2
+                    self.received += 1
+                    self.publish(topic.decode("utf-8"), body[offset:],
+                                 bool(flags & 0x01))
+                elif packet_type == SUBSCRIBE:
+                    offset, granted, added = 2, bytearray(), []
+                    while offset < len(body):
+                        topic, offset = _string(body, offset)
+                        added.append(topic.decode("utf-8"))
+                        filters.add(added[-1])
+                        offset += 1
+                        granted.append(0)
+                    writer.write(_packet(SUBACK, 0, body[:2] + bytes(granted)))
+                    for topic, payload in list(self._retained.items()):
+                        if any(topic_matches(f, topic) for f in added):
+                            writer.write(_publish_packet(topic, payload, True))
+                            self.delivered += 1
+                elif packet_type == UNSUBSCRIBE:
+                    offset = 2
+                    while offset < len(body):
+                        topic, offset = _string(body, offset)
+                        filters.discard(topic.decode("utf-8"))
+                    writer.write(_packet(UNSUBACK, 0, body[:2]))
+                elif packet_type == PINGREQ:
+                    writer.write(_packet(PINGRESP, 0, b""))
+                elif packet_type == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._subscriptions.pop(writer, None)
+            writer.close()
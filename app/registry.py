@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Per station AquaCrop models
+
+Every station has its own soil moisture, etc and precipitation
+history, so each one must be computed by its own AquaCropModel
+instance. The registry builds the models lazily from the station
+crop config and evicts the ones that were not used for a while.
+The state of the models can be saved and loaded back, the loaded
+states are only turned into models on the station next reading.
+"""
+
+import time
+from collections import OrderedDict
+
+from labmet.fao_aquacrop_model.prodfao import AquaCropModel
+
+
+class AquaCropRegistry(object):
+    """AquaCrop Registry
+
+    Keyed collection of AquaCropModel instances, one per station id,
+    with least recently used and time to live eviction.
+
+    :param default_config: The AquaCropModel kwargs used when the station
+     has no config of its own
+    :param configs: A dict of station id -> AquaCropModel kwargs
+    :param maxsize: Maximum number of models kept in memory, None is unbounded
+    :param ttl: Seconds without readings before the model is dropped,
+     None never expires
+
+    :type default_config: dict
+    :type configs: dict
+    :type maxsize: int or None
+    :type ttl: int, float or None
+    """
+
+    def __init__(self, default_config, configs=None, maxsize=1024, ttl=None):
+        self.default_config = default_config
+        self.configs = dict((str(k), v) for k, v in (configs or {}).items())
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._models = OrderedDict()
+        self._states = {}
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, station_id):
+        return str(station_id) in self._models
+
+    def config(self, station_id):
+        """Station config
+
+        :param station_id: The station id
+        :return: The AquaCropModel kwargs of the station
+        :rtype: dict
+        """
+        return self.configs.get(str(station_id), self.default_config)
+
+    def get(self, station_id):
+        """Get the station model
+
+        Returns the station model, building it on the first
+        reading or after it has been evicted.
+
+        :param station_id: The station id
+
+        :type station_id: int or str
+
+        :return: The station model
+        :rtype: AquaCropModel
+        """
+        key = str(station_id)
+        now = time.time()
+        entry = self._models.pop(key, None)
+        if entry is None:
+            entry = self._states.pop(key, None)
+            if entry is not None:
+                model = AquaCropModel(**self.config(key))
+                model.set_state(entry[0])
+                entry = (model, entry[1])
+        if entry is None or (self.ttl is not None and
+                             now - entry[1] > self.ttl):
+            model = AquaCropModel(**self.config(key))
+        else:
+            model = entry[0]
+
+        self._models[key] = (model, now)
+        self.evict(now)
+        return model
+
+    def evict(self, now=None):
+        """Evict models
+
+        Drops the models that are expired or that exceed
+        the registry maxsize, oldest first.
+
+        :param now: The current timestamp (default=time.time())
+        :return: The evicted station ids
+        :rtype: list
+        """
+        if now is None:
+            now = time.time()
+
+        evicted = []
+        while self._models:
+            key, (model, last_seen) = next(iter(self._models.items()))
+            expired = self.ttl is not None and now - last_seen > self.ttl
+            if not expired and (self.maxsize is None or
+                                len(self._models) <= self.maxsize):
+                break
+            del self._models[key]
+            evicted.append(key)
+        return evicted
+
+    def restore(self, station_id, state):
+        """Restore the station model
+
+        Replaces the station model by one with the state returned
+        by AquaCropModel.get_state, e.g. from another worker
+
+        :param station_id: The station id
+        :param state: The model state
+
+        :type station_id: int or str
+        :type state: dict
+
+        :return: The station model
+        :rtype: AquaCropModel
+        """
+        key = str(station_id)
+        model = AquaCropModel(**self.config(key))
+        model.set_state(state)
+        now = time.time()
+        self._states.pop(key, None)
+        self._models.pop(key, None)
+        self._models[key] = (model, now)
+        self.evict(now)
+        return model
+
+    def discard(self, station_id):
+        """Drops the station model, if any"""
+        self._states.pop(str(station_id), None)
+        return self._models.pop(str(station_id), (None, None))[0]
+
+    def states(self):
+        """States
+
+        The state of every station, including the loaded
+        states not turned into models yet and not expired
+
+        :return: (station id, AquaCropModel.get_state(), last seen) tuples
+        :rtype: list
+        """
+        now = time.time()
+        states = [(k, state, last_seen)
+                  for k, (state, last_seen) in self._states.items()
+                  if self.ttl is None or now - last_seen <= self.ttl]
+        states.extend((k, model.get_state(), last_seen)
+                      for k, (model, last_seen) in self._models.items())
+        return states
+
+    def load_states(self, states):
+        """Load states
+
+        Keeps the states returned by states, each one
+        restored on the next reading of its station
+
+        :param states: (station id, state, last seen) tuples
+        :type states: iterable
+        """
+        for station_id, state, last_seen in states:
+            key = str(station_id)
+            if key not in self._models:
+                self._states[key] = (state, last_seen)
+
+    def items(self):
+        """(station id, model) pairs, least recently used first"""
+        return [(k, v[0]) for k, v in self._models.items()]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Replay
+
+Recomputes the AquaCrop outputs of the stored raw readings, used
+when the crop parameters of a station change mid season. Each
+station is replayed in chronological order by one process, the
+stations run in parallel. The progress of each station is saved
+after every chunk, so an interrupted replay resumes where it stopped.
+"""
+
+import os
+import json
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from labmet.fao_aquacrop_model.prodfao import AquaCropModel
+from app.storage import create_storage, SensorArchive, READING_FIELDS
+
+SOIL_MOISTURE = READING_FIELDS.index("analog_soil_moisture") + 1
+TEMPERATURE = READING_FIELDS.index("ds18b20_temp") + 1
+ILLUMINANCE = READING_FIELDS.index("bh1750_illuminance") + 1
+
+
+def _checkpoint_path(checkpoint_dir, station_id):
+    return os.path.join(checkpoint_dir, "%s.json" % station_id)
+
+
+def load_checkpoint(checkpoint_dir, station_id):
+    """The station checkpoint, None when there is none"""
+    if checkpoint_dir is None:
+        return None
+    try:
+        with open(_checkpoint_path(checkpoint_dir, station_id)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_checkpoint(checkpoint_dir, station_id, checkpoint):
+    """Writes the station checkpoint, replacing the old one atomically"""
+    if checkpoint_dir is None:
+        return
+    path = _checkpoint_path(checkpoint_dir, station_id)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    getattr(os, "replace", os.rename)(tmp_path, path)  # py2 os.rename
+
+
+def replay_station(storage_url, station_id, config, start=None, end=None,
+                   checkpoint_dir=None, chunk=50000, archive=None):
+    """Replay station
+
+    Streams the station raw readings in chronological order
+    through a new AquaCropModel and replaces the stored outputs.
+
+    :param storage_url: The storage url
+    :param station_id: The station id
+    :param config: The AquaCropModel kwargs of the station
+    :param start: The first collected_at replayed
+    :param end: The last collected_at replayed
+    :param checkpoint_dir: Directory of the progress checkpoints
+    :param chunk: Readings computed and written at once
+    :param archive: A SensorArchive directory, read instead of
+     the storage readings
+
+    :return: The station id and the number of readings replayed
+    :rtype: tuple
+    """
+    model = AquaCropModel(**config)
+    replayed = 0
+    # readings of the start second already replayed, the readings
+    # of a station can share their collected_at
+    done_at_start = 0
+
+    # a checkpoint is only valid for the same config and range, a
+    # done one without end goes on with the readings stored since
+    scope = {"config": config, "start": start, "end": end}
+    checkpoint = load_checkpoint(checkpoint_dir, station_id)
+    if checkpoint is not None and \
+            all(checkpoint.get(k) == v for k, v in scope.items()):
+        if checkpoint["done"] and end is not None:
+            return station_id, checkpoint["replayed"]
+        model.set_state(checkpoint["state"])
+        start = checkpoint["collected_at"]
+        replayed = checkpoint["replayed"]
+        done_at_start = checkpoint.get("done_at_start", 1)
+
+    storage = create_storage(storage_url)
+    source = storage if archive is None else SensorArchive(archive)
+    try:
+        while True:
+            if archive is None:
+                rows = np.array(storage.readings(station_id, start, end,
+                                                 limit=chunk + done_at_start),
+                                dtype=np.float64).reshape(
+                    -1, len(READING_FIELDS) + 1)
+            else:
+                rows = source.readings_array(station_id, start, end,
+                                             limit=chunk + done_at_start)
+            skip = min(done_at_start, int((rows[:, 0] == start).sum()))
+            rows = rows[skip:]
+            if not len(rows):
+                break
+
+            readings = rows[~np.isnan(rows[:, [SOIL_MOISTURE,
+                                                       TEMPERATURE,
+                                                       ILLUMINANCE]]).any(axis=1)]
+            if len(readings):
+                results = model.aqua_crop_batch(
+                    readings[:, SOIL_MOISTURE],
+                    readings[:, TEMPERATURE],
+                    readings[:, ILLUMINANCE],
+                    [datetime.fromtimestamp(t, timezone.utc)
+                     for t in readings[:, 0]])
+                storage.insert_outputs(
+                    [(str(station_id), t) + tuple(r) for t, r in
+                     zip(readings[:, 0].tolist(), results.tolist())])
+
+            replayed += len(readings)
+            done_at_start = int((rows[:, 0] == rows[-1, 0]).sum())
+            if rows[-1, 0] == start:
+                done_at_start += skip
+            start = float(rows[-1, 0])
+            save_checkpoint(checkpoint_dir, station_id,
+                            dict(scope, done=False, collected_at=start,
+                                 done_at_start=done_at_start,
+                                 replayed=replayed,
+                                 state=model.get_state()))
+
+        save_checkpoint(checkpoint_dir, station_id,
+                        dict(scope, done=True, collected_at=start,
+                             done_at_start=done_at_start, replayed=replayed,
+                             state=model.get_state()))
+    finally:
+        storage.close()
+    return station_id, replayed
+
+
+def replay(storage_url, stations, configs, default_config, start=None,
+           end=None, checkpoint_dir=None, workers=None, chunk=50000,
+           archive=None):
+    """Replay
+
+    Replays the stations in parallel processes
+
+    :param storage_url: The storage url
+    :param stations: The station ids, all the stored stations when empty
+    :param configs: A dict of station id -> AquaCropModel kwargs
+    :param default_config: The kwargs of the stations without config
+    :param workers: Number of processes, default the number of cpus
+    :param archive: A SensorArchive directory of the readings
+
+    :return: A dict of station id -> readings replayed
+    :rtype: dict
+    """
+    if not stations:
+        storage = create_storage(storage_url) if archive is None \
+            else SensorArchive(archive)
+        stations = storage.stations()
+        storage.close()
+
+    if checkpoint_dir is not None and not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+
+    replayed = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(replay_station, storage_url, str(station),
+                                   configs.get(str(station), default_config),
+                                   start, end, checkpoint_dir, chunk,
+                                   archive)
+                   for station in stations]
+        for future in as_completed(futures):
+            station_id, count = future.result()
+            replayed[station_id] = count
+            print("station %s: %d readings replayed (%d/%d)" %
+                  (station_id, count, len(replayed), len(futures)))
+    return replayed
@@ -1 +1 @@
-from .mqtt_handler import MQTTThread
\ No newline at end of file
+from .mqtt_handler import MQTTIngestion
\ No newline at end of file
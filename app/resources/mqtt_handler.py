@@ -1,12 +1,178 @@
-# from threading import Thread
-# from .. import client
-#
-#
-# class MQTTThread(Thread):
-#     def __init__(self):
-#         Thread.__init__(self)
-#         self.stop = False
-#
-#     def run(self):
-#         while not self.stop and client.loop_forever() == 0:
-#             pass
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""In-process ingestion
+
+The Socket.IO server can own the MQTT subscription, so the readings
+are computed and broadcast without the worker.py hop. The external
+worker stays the way to spread the compute over many processes.
+
+The MQTT loop is a Socket.IO background task that never blocks: it
+reads the socket without waiting and yields with socketio.sleep, so
+it runs in the async mode of the server, threading, eventlet or
+gevent, without monkey patching. The blocking calls, the broker
+connect, the storage flush and the checkpoint, run in a native thread
+of the eventlet or gevent pool, so they never stop the hub.
+"""
+
+import time
+import socket
+
+import paho.mqtt.client as mqtt
+
+from app.checkpoint import load_states, save_states
+from app.ingestion import process_payload
+from app.metrics import stamp
+from app.storage import StorageWriter
+
+
+class MQTTIngestion(object):
+    """MQTT Ingestion
+
+    Subscribes to the stations topic with the app MQTT config and
+    runs each reading through its station model as it arrives.
+
+    :param app: The Flask app, for its MQTT config
+    :param socketio: The Flask-SocketIO instance running the task
+    :param registry: The station models registry
+    :param publish: Function called with each enriched reading
+    :param storage: The storage of the readings, None to disable
+    :param flush: Storage flush interval in seconds
+    :param reconnect_delay: Seconds between reconnect attempts
+    :param checkpoint: File of the station models state, loaded
+     at start and saved every checkpoint_interval seconds
+    :param checkpoint_interval: Seconds between checkpoints
+    :param poll: Seconds the task sleeps when the socket is idle
+
+    :type app: flask.Flask
+    :type socketio: flask_socketio.SocketIO
+    :type registry: app.registry.AquaCropRegistry
+    :type publish: callable
+    :type storage: app.storage.Storage
+    :type flush: float
+    :type reconnect_delay: float
+    :type checkpoint: str or None
+    :type checkpoint_interval: float
+    :type poll: float
+    """
+
+    def __init__(self, app, socketio, registry, publish, storage=None,
+                 flush=1.0, reconnect_delay=5.0, checkpoint=None,
+                 checkpoint_interval=60.0, poll=0.01):
+        self.stop = False
+        self.stopped = False
+        self.socketio = socketio
+        self.config = app.config
+        self.registry = registry
+        self.publish = publish
+        self.writer = StorageWriter(storage) if storage is not None else None
+        self.flush = flush
+        self.reconnect_delay = reconnect_delay
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.poll = poll
+        self.received = 0
+        self.errors = 0
+
+        self.client = mqtt.Client()
+        self.client.username_pw_set(username=self.config['MQTT_USERNAME'],
+                                    password=self.config['MQTT_PASSWORD'])
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc):
+        print("Connected MQTT [%s:%s] topic [%s]" %
+              (self.config['MQTT_BROKER_URL'], self.config['MQTT_PORT'],
+               self.config['MQTT_TOPIC']))
+        client.subscribe(self.config['MQTT_TOPIC'], self.config['MQTT_QOS'])
+
+    def on_message(self, client, userdata, msg):
+        received = time.time()
+        self.received += 1
+        try:
+            data = process_payload(self.registry, msg.payload)
+            stamp(data, "received", received)
+            if self.writer is not None:
+                self.writer.add(data)
+            self.publish(data)
+        except Exception as e:
+            self.errors += 1
+            print("Error: %s" % e)
+
+    def _blocking(self, function, *args):
+        # a native thread under a green hub, the caller waits without
+        # holding the hub
+        async_mode = self.socketio.async_mode
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(function, *args)
+        if async_mode == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.apply(function, args)
+        return function(*args)
+
+    def _flush(self):
+        # a failed write keeps its rows for the next flush
+        try:
+            self._blocking(self.writer.flush)
+        except Exception as e:
+            print("Storage error: %s" % e)
+
+    def _save_states(self):
+        try:
+            self._blocking(save_states, self.registry, self.checkpoint)
+        except (IOError, OSError) as e:
+            print("Checkpoint error: %s" % e)
+
+    def _connect(self):
+        try:
+            if self._blocking(self.client.connect,
+                              self.config['MQTT_BROKER_URL'],
+                              self.config['MQTT_PORT'],
+                              self.config['MQTT_KEEP_ALIVE']) == \
+                    mqtt.MQTT_ERR_SUCCESS:
+                return True
+        except (socket.error, OSError, IOError) as e:
+            print("Error: %s" % e)
+        return False
+
+    def start(self):
+        """Starts the MQTT loop as a Socket.IO background task"""
+        return self.socketio.start_background_task(self.run)
+
+    def join(self):
+        """Waits for the loop to save its state after a stop"""
+        while not self.stopped:
+            self.socketio.sleep(self.poll)
+
+    def run(self):
+        if self.checkpoint:
+            print("%d station states loaded" %
+                  load_states(self.registry, self.checkpoint))
+        connected = self._connect()
+        flushed = checkpointed = time.time()
+        while not self.stop:
+            if not connected:
+                self.socketio.sleep(self.reconnect_delay)
+                connected = self._connect()
+                continue
+            # the select of a 0 timeout loop returns at once, the
+            # task only sleeps when no message was read
+            received = self.received
+            if self.client.loop(timeout=0) != mqtt.MQTT_ERR_SUCCESS:
+                connected = False
+            self.socketio.sleep(0 if self.received != received else self.poll)
+            if self.writer is not None and \
+                    time.time() - flushed >= self.flush:
+                self._flush()
+                flushed = time.time()
+            if self.checkpoint and \
+                    time.time() - checkpointed >= self.checkpoint_interval:
+                self._save_states()
+                checkpointed = time.time()
+
+        if self.writer is not None:
+            self._flush()
+        if self.checkpoint:
+            self._save_states()
+        self.client.disconnect()
+        self.stopped = True
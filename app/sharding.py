@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Sharded ingestion
+
+The station models keep state, so the readings of a station must
+always be computed by the same worker. The router reads the station
+topic and republishes each reading on the topic of its shard,
+<topic>/<shard>, chosen by a consistent hash ring of the station id.
+Each worker subscribes to the topic of its own shard.
+
+The ring is a retained message on <topic>/_ring, written by the
+router. When it changes the workers publish the state of the
+stations they no longer own on <topic>/_handoff/<shard> of their new
+shard, which restores them, so a station keeps its soil moisture
+and history across the rebalance. Only about 1/n of the stations
+move when a shard is added or removed.
+
+A station state lives in one worker at a time: the old owner drops
+the readings of the moved stations still waiting in its queues,
+after their state is handed off, and the new owner holds the readings
+of the stations moving to it until their state arrives, or for
+handoff_timeout seconds when the old owner is gone.
+"""
+
+import json
+import time
+import bisect
+import hashlib
+
+from app.codec import decode
+
+RING = "_ring"
+HANDOFF = "_handoff"
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def shard_topic(topic, shard):
+    """The topic of a shard readings"""
+    return "%s/%s" % (topic, shard)
+
+
+def ring_topic(topic):
+    """The topic of the retained ring shards"""
+    return "%s/%s" % (topic, RING)
+
+
+def handoff_topic(topic, shard):
+    """The topic of the station states handed to a shard"""
+    return "%s/%s/%s" % (topic, HANDOFF, shard)
+
+
+class HashRing(object):
+    """Hash Ring
+
+    Consistent hashing of the station ids over the shards, with
+    vnodes points by shard to even out the number of stations
+
+    :param shards: The shard names
+    :param vnodes: Points on the ring by shard
+
+    :type shards: list
+    :type vnodes: int
+    """
+
+    def __init__(self, shards, vnodes=64):
+        self.vnodes = vnodes
+        self.shards = []
+        self._points = []
+        self._owners = []
+        for shard in shards:
+            self.add(shard)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def __eq__(self, other):
+        return isinstance(other, HashRing) and \
+            sorted(self.shards) == sorted(other.shards) and \
+            self.vnodes == other.vnodes
+
+    def __ne__(self, other):
+        return not self == other
+
+    def add(self, shard):
+        shard = str(shard)
+        if not shard or shard.startswith("_") or "/" in shard or \
+                "+" in shard or "#" in shard:
+            raise ValueError("Invalid shard name %r" % shard)
+        if shard in self.shards:
+            return
+        self.shards.append(shard)
+        for vnode in range(self.vnodes):
+            point = _hash("%s#%d" % (shard, vnode))
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, shard)
+
+    def remove(self, shard):
+        shard = str(shard)
+        if shard not in self.shards:
+            return
+        self.shards.remove(shard)
+        kept = [(p, o) for p, o in zip(self._points, self._owners)
+                if o != shard]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def shard(self, station_id):
+        """The shard of a station id"""
+        if not self._points:
+            raise ValueError("The ring has no shards")
+        index = bisect.bisect(self._points, _hash(str(station_id)))
+        return self._owners[index % len(self._owners)]
+
+    def dumps(self):
+        return json.dumps({"shards": self.shards, "vnodes": self.vnodes})
+
+    @classmethod
+    def loads(cls, data):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        data = json.loads(data)
+        return cls(data["shards"], data.get("vnodes", 64))
+
+
+class ShardRouter(object):
+    """Shard Router
+
+    Republishes the station readings on their shard topics,
+    the payloads are decoded only to read the station id
+
+    :param client: A connected paho client
+    :param topic: The station readings topic
+    :param ring: The shards ring
+    :param qos: The publish qos
+
+    :type client: paho.mqtt.client.Client
+    :type topic: str
+    :type ring: HashRing
+    :type qos: int
+    """
+
+    def __init__(self, client, topic, ring, qos=0):
+        if "+" in topic or "#" in topic:
+            raise ValueError("The router topic %r can not have "
+                             "wildcards" % topic)
+        self.client = client
+        self.topic = topic
+        self.ring = ring
+        self.qos = qos
+        self.routed = dict((shard, 0) for shard in ring.shards)
+        self.errors = 0
+        self.client.message_callback_add(topic, self.on_message)
+
+    def subscribe(self):
+        """Subscribes to the readings and publishes the ring,
+        call it from the client on_connect"""
+        self.client.publish(ring_topic(self.topic), self.ring.dumps(),
+                            qos=1, retain=True)
+        self.client.subscribe(self.topic, self.qos)
+
+    def on_message(self, client, userdata, msg):
+        try:
+            shard = self.ring.shard(decode(msg.payload).get("id"))
+        except Exception as e:
+            self.errors += 1
+            print("Error: %s" % e)
+            return
+        self.routed[shard] = self.routed.get(shard, 0) + 1
+        client.publish(shard_topic(self.topic, shard), msg.payload, self.qos)
+
+
+class ShardMember(object):
+    """Shard Member
+
+    Keeps the station models of one shard: follows the ring,
+    hands off the stations that move to another shard and
+    restores the ones handed to this shard
+
+    :param client: A connected paho client
+    :param registry: The station models registry
+    :param topic: The station readings topic
+    :param shard: The shard name of the worker
+    :param qos: The subscribe qos
+    :param release: Function called with each held payload once it
+     can be computed, the pipeline feed
+    :param handoff_timeout: Seconds to hold the readings of a station
+     moving to this shard waiting for its state
+
+    :type client: paho.mqtt.client.Client
+    :type registry: app.registry.AquaCropRegistry
+    :type topic: str
+    :type shard: str
+    :type qos: int
+    :type release: callable
+    :type handoff_timeout: float
+    """
+
+    def __init__(self, client, registry, topic, shard, qos=0, release=None,
+                 handoff_timeout=10.0):
+        self.client = client
+        self.registry = registry
+        self.topic = topic
+        self.shard = str(shard)
+        self.qos = qos
+        self.release = release
+        self.handoff_timeout = handoff_timeout
+        self.ring = None
+        self.previous_ring = None
+        self.handed_off = 0
+        self.restored = 0
+        self.dropped = 0
+        self.held = 0
+        self.stale = 0
+        self._deadline = 0
+        self._arrived = set()
+        self._waiting = {}
+        self.client.message_callback_add(ring_topic(topic), self.on_ring)
+        self.client.message_callback_add(handoff_topic(topic, self.shard),
+                                         self.on_handoff)
+
+    @property
+    def readings_topic(self):
+        return shard_topic(self.topic, self.shard)
+
+    def subscribe(self):
+        """Subscribes to the shard topics, call it from the client
+        on_connect"""
+        self.client.subscribe([(self.readings_topic, self.qos),
+                               (ring_topic(self.topic), 1),
+                               (handoff_topic(self.topic, self.shard), 1)])
+
+    def owns(self, station_id):
+        return self.ring is None or self.ring.shard(station_id) == self.shard
+
+    def incoming(self, station_id):
+        """True while the state of a station moving to this shard
+        has not arrived"""
+        return self.previous_ring is not None and \
+            time.time() < self._deadline and \
+            station_id not in self._arrived and \
+            self.previous_ring.shard(station_id) != self.shard
+
+    def accept(self, data, payload):
+        """Accept
+
+        Checks a reading before its compute: the readings of stations
+        of other shards are dropped and the ones of stations moving to
+        this shard are held until their state arrives
+
+        :param data: The decoded reading
+        :param payload: The raw payload, kept while held
+
+        :type data: dict
+        :type payload: bytes
+
+        :return: True when the reading can be computed now
+        :rtype: bool
+        """
+        self.release_expired()
+        station_id = str(data.get("id"))
+        if not self.owns(station_id):
+            self.dropped += 1
+            return False
+        if self.incoming(station_id):
+            self._waiting.setdefault(station_id, []).append(payload)
+            self.held += 1
+            return False
+        return True
+
+    def _release(self, station_id):
+        payloads = self._waiting.pop(station_id, ())
+        if self.release is not None:
+            for payload in payloads:
+                self.release(payload)
+
+    def release_expired(self):
+        """Releases the held readings once the handoff timeout is
+        over, for states that never arrive"""
+        if self._waiting and time.time() >= self._deadline:
+            for station_id in list(self._waiting):
+                self._release(station_id)
+
+    def on_ring(self, client, userdata, msg):
+        ring = HashRing.loads(msg.payload)
+        if ring == self.ring:
+            return
+        self.previous_ring, self.ring = self.ring, ring
+        self._deadline = time.time() + self.handoff_timeout
+        self._arrived = set()
+        # held readings are checked again with the new ring
+        for station_id in list(self._waiting):
+            self._release(station_id)
+        print("Ring [%s], shard [%s]" % (", ".join(ring.shards), self.shard))
+        # states() also has the checkpoint states not used yet, the
+        # stations that moved while the worker was down
+        for station_id, state, _ in self.registry.states():
+            if self.owns(station_id):
+                continue
+            client.publish(handoff_topic(self.topic, ring.shard(station_id)),
+                           json.dumps({"id": station_id, "state": state}),
+                           qos=1)
+            self.registry.discard(station_id)
+            self.handed_off += 1
+
+    def on_handoff(self, client, userdata, msg):
+        data = decode(msg.payload)
+        station_id = str(data["id"])
+        if station_id in self.registry and not self.incoming(station_id):
+            # came after the timeout, the model already went on
+            self.stale += 1
+            return
+        self.registry.restore(station_id, data["state"])
+        self._arrived.add(station_id)
+        self.restored += 1
+        self._release(station_id)
@@ -9,13 +9,14 @@
 
             var showMsgDisc = false,
                 shoMsgConn = true,
-                graphicsData = {},
-                lastIndex = 1; // simple example plot x
+                graphicsData = {};
 
             var options = $.extend({
                 'host': _defaulthost,
                 '_ids': [],
                 'namespace': 'weather_data',
+                'history': 130 * 24 * 3600, // seconds of history to load
+                'points': 2000 // max history points by station
             }, _options);
 
             var _ids = options['_ids'];
@@ -65,13 +66,44 @@
             };
 
 
+            /*
+            load the downsampled productivity history of a station,
+            the live points are added after it
+            */
+            var loadHistory = function(_id) {
+              var start = Date.now() / 1000 - options['history'];
+              $.getJSON(options['host'] + '/stations/' + _id + '/productivity',
+                        {'start': start, 'points': options['points']},
+                        function(history) {
+                var data = history['data'],
+                    n = data['collected_at'].length,
+                    pot = [], obt = [];
+
+                for (var i = 0; i < n; i++) {
+                  pot.push([i + 1, data['potential_productivity'][i]]);
+                  obt.push([i + 1, data['obtainable_productivity'][i]]);
+                }
+                // keep the live points received while loading
+                $.each(graphicsData[_id]['data_pot'], function(i, point) {
+                  pot.push([n + i + 1, point[1]]);
+                });
+                $.each(graphicsData[_id]['data_obt'], function(i, point) {
+                  obt.push([n + i + 1, point[1]]);
+                });
+                graphicsData[_id]['data_pot'] = pot;
+                graphicsData[_id]['data_obt'] = obt;
+                graphicsData[_id]['index'] = pot.length + 1;
+                PlotData(_id);
+              });
+            };
+
             if (_ids.length > 0 && _ids.length <= 10) {
 
               for (var i = 0; i < _ids.length; i++) {
                 var _id = _ids[i];
 
-                // creating for populate data
-                graphicsData[_id] = {'data_obt': [], 'data_pot':[]};
+                // creating for populate data, index is the plot x
+                graphicsData[_id] = {'data_obt': [], 'data_pot':[], 'index': 1};
 
                 var card = ['<div class="browser-mockup" style="background-color: #fff; margin-top: 25px;">',
                 '    <div><img class="ico-labmet" src="/static/img/icon.png" /></div>',
@@ -158,6 +190,7 @@
                 $(this).append(card);
 
                 PlotData(_id);
+                loadHistory(_id);
               }
             }
 
@@ -239,9 +272,14 @@
             /*
             function set data
             */
-            var setData = function(data) {
+            var setData = function(data, redraw) {
                 var _data = data;
                 var _id = _data['id'];
+
+                if (!graphicsData.hasOwnProperty(_id)) {
+                    return;
+                }
+
                 $.each(_data, function(key, value) {
                     if (key === "collected_at") {
                         $('#' + key + '-' + _id).text(value);
@@ -254,14 +292,13 @@
                 });
 
                 // populate new data
-                graphicsData[_id]['data_pot'].push([lastIndex, _data['potential_productivity']]);
-                graphicsData[_id]['data_obt'].push([lastIndex, _data['obtainable_productivity']]);
-                PlotData(_id);
-                lastIndex = lastIndex + 1; // X coordinate
-
-                window.onresize = function(event) {
+                var index = graphicsData[_id]['index'];
+                graphicsData[_id]['data_pot'].push([index, _data['potential_productivity']]);
+                graphicsData[_id]['data_obt'].push([index, _data['obtainable_productivity']]);
+                if (redraw !== false) {
                     PlotData(_id);
                 }
+                graphicsData[_id]['index'] = index + 1; // X coordinate
 
                 var potatoval = toPerce(_data['obtainable_productivity']);
                 if (potatoval >= 0 && potatoval <= 100) {
@@ -272,6 +309,9 @@
 
 
             socket.on('connect', function() {
+                // receive only the stations of this dashboard
+                socket.emit('subscribe', {'ids': _ids});
+
                 $('.status').removeClass('status-disconnected');
                 $('.status').addClass('status-connected');
 
@@ -310,6 +350,33 @@
                 setData(msg);
             });
 
+            /*
+            receive a batch of station data, one redraw by station,
+            json or msgpack frames (BROADCAST_FORMAT)
+            */
+            socket.on('station_batch', function(msg) {
+                var batch = typeof msg === 'string' ? JSON.parse(msg) :
+                        msg instanceof ArrayBuffer ?
+                        msgpack.decode(new Uint8Array(msg)) : msg,
+                    touched = {};
+
+                for (var i = 0; i < batch.length; i++) {
+                    setData(batch[i], false);
+                    touched[batch[i]['id']] = true;
+                }
+                $.each(touched, function(_id) {
+                    if (graphicsData.hasOwnProperty(_id)) {
+                        PlotData(_id);
+                    }
+                });
+            });
+
+            window.onresize = function(event) {
+                $.each(graphicsData, function(_id) {
+                    PlotData(_id);
+                });
+            };
+
             return this;
         }
     });
@@ -0,0 +1,50 @@
+from .base import (Storage, StorageWriter, parse_collected_at,
+                   READING_FIELDS, OUTPUT_FIELDS)
+from .sqlite import SQLiteStorage
+from .archive import SensorArchive
+
+backends = {'sqlite': SQLiteStorage}
+
+
+def create_storage(url):
+    """Create storage
+
+    Builds the storage backend of an url like
+    sqlite:///labmet.db, sqlite:// is a memory database
+
+    :param url: The storage url
+    :type url: str
+
+    :rtype: Storage
+    """
+    scheme, _, path = url.partition('://')
+    if scheme not in backends:
+        raise ValueError("Storage %r not available, use one of: %s" %
+                         (scheme, ", ".join(sorted(backends))))
+    if scheme == 'sqlite':
+        path = path[1:] if path.startswith('/') else path
+        return SQLiteStorage(path or ':memory:')
+    return backends[scheme](path)
+
+
+class FlaskStorage(object):
+    """Flask storage
+
+    Creates the app storage from the STORAGE_URL config
+    and proxies the storage methods.
+    """
+
+    def __init__(self, app=None):
+        self.storage = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.storage = create_storage(app.config['STORAGE_URL'])
+        app.extensions['storage'] = self.storage
+
+    def __getattr__(self, name):
+        if self.storage is None:
+            raise RuntimeError("The storage was not initialized, "
+                               "call init_app first")
+        return getattr(self.storage, name)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Sensor archive
+
+A compact columnar archive of the station raw readings. Each station
+day is a directory with one append-only file by column, of fixed
+width little-endian values:
+
+    <root>/<station_id>/<YYYY-MM-DD>/collected_at.u4
+    <root>/<station_id>/<YYYY-MM-DD>/bmp180_temp.f4
+    ...
+
+collected_at is in whole seconds since the epoch (UTC days), the
+illuminance is an uint16 in lx and the other sensors float32. The
+columns are read with np.memmap, so a season scan maps the files
+instead of parsing messages. The archive keeps the raw readings
+only, the model outputs stay in the storage.
+"""
+
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .base import Storage, READING_FIELDS
+
+COLUMNS = (("collected_at", np.dtype("<u4")),) + tuple(
+    (field, np.dtype("<u2") if field == "bh1750_illuminance" else
+     np.dtype("<f4")) for field in READING_FIELDS)
+
+# uint16 value of a missing illuminance
+MISSING_U2 = 0xffff
+
+_DAY_FORMAT = "%Y-%m-%d"
+_STATION_ID = re.compile(r"^[\w.-]+$")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _valid_station_id(station_id):
+    return bool(_STATION_ID.match(station_id)) and \
+        station_id not in (".", "..")
+
+
+def _day_of(timestamp):
+    return (_EPOCH + timedelta(seconds=int(timestamp))).strftime(_DAY_FORMAT)
+
+
+def _day_start(day):
+    return (datetime.strptime(day, _DAY_FORMAT) - _EPOCH).total_seconds()
+
+
+def _extension(dtype):
+    return dtype.kind + str(dtype.itemsize)
+
+
+class SensorArchive(Storage):
+    """Sensor Archive
+
+    :param root: The archive directory
+    :type root: str
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def _station_dir(self, station_id):
+        station_id = str(station_id)
+        if not _valid_station_id(station_id):
+            raise ValueError("Invalid station id %r for the archive" %
+                             station_id)
+        return os.path.join(self.root, station_id)
+
+    def _path(self, station_id, day, column, dtype):
+        return os.path.join(self._station_dir(station_id), day,
+                            "%s.%s" % (column, _extension(dtype)))
+
+    def append(self, station_id, collected_at, values):
+        """Append
+
+        Appends readings of a station to the day files
+
+        :param station_id: The station id
+        :param collected_at: The readings collected_at, seconds since the epoch
+        :param values: A dict of READING_FIELDS arrays, NaN when missing
+
+        :type station_id: str or int
+        :type collected_at: sequence of int or float
+        :type values: dict
+        """
+        collected_at = np.asarray(collected_at, dtype=np.float64)
+        if not len(collected_at):
+            return
+        days = np.array([_day_of(t) for t in collected_at])
+
+        columns = {"collected_at": np.floor(collected_at).astype("<u4")}
+        for field, dtype in COLUMNS[1:]:
+            column = np.asarray(values[field], dtype=np.float64)
+            if dtype.kind == "u":
+                missing = np.isnan(column)
+                column = np.clip(np.round(np.where(missing, 0, column)),
+                                 0, MISSING_U2 - 1)
+                column[missing] = MISSING_U2
+            columns[field] = column.astype(dtype)
+
+        with self._lock:
+            for day in np.unique(days):
+                selected = days == day
+                directory = os.path.join(self._station_dir(station_id), day)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                self._truncate(station_id, day)
+                # the index last, so a reader never sees rows
+                # with missing sensor values
+                for column, dtype in COLUMNS[1:] + COLUMNS[:1]:
+                    with open(self._path(station_id, day, column, dtype),
+                              "ab") as f:
+                        f.write(columns[column][selected].tobytes())
+
+    def _truncate(self, station_id, day):
+        # an append that failed halfway left the sensor columns longer
+        # than the index, they are cut back to the indexed rows so the
+        # next rows stay aligned
+        index = self._path(station_id, day, *COLUMNS[0])
+        rows = os.path.getsize(index) // COLUMNS[0][1].itemsize \
+            if os.path.exists(index) else 0
+        for column, dtype in COLUMNS:
+            path = self._path(station_id, day, column, dtype)
+            if os.path.exists(path) and \
+                    os.path.getsize(path) != rows * dtype.itemsize:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * dtype.itemsize)
+
+    def insert_readings(self, rows):
+        """Appends Storage rows of (station_id, collected_at, READING_FIELDS)"""
+        by_station = {}
+        for row in rows:
+            by_station.setdefault(str(row[0]), []).append(row[1:])
+        for station_id, station_rows in by_station.items():
+            if not _valid_station_id(station_id):
+                # never archived, kept out of the writer retries
+                print("Invalid station id %r for the archive, %d readings "
+                      "dropped" % (station_id, len(station_rows)))
+                continue
+            table = np.array([[np.nan if v is None else v for v in row]
+                              for row in station_rows], dtype=np.float64)
+            self.append(station_id, table[:, 0],
+                        dict((field, table[:, i + 1])
+                             for i, field in enumerate(READING_FIELDS)))
+
+    def insert_outputs(self, rows):
+        """The archive keeps the raw readings only"""
+        pass
+
+    def stations(self):
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def days(self, station_id, start=None, end=None):
+        """The station days with readings between start and end"""
+        directory = self._station_dir(station_id)
+        if not os.path.isdir(directory):
+            return []
+        first = None if start is None else _day_of(start)
+        last = None if end is None else _day_of(end)
+        return [day for day in sorted(os.listdir(directory))
+                if (first is None or day >= first) and
+                (last is None or day <= last)]
+
+    def day(self, station_id, day):
+        """Day
+
+        The columns of a station day as read-only memory maps,
+        no data is copied or converted
+
+        :param station_id: The station id
+        :param day: The day, YYYY-MM-DD
+
+        :return: A dict of column name -> numpy.memmap
+        :rtype: dict
+        """
+        paths = [(column, dtype, self._path(station_id, day, column, dtype))
+                 for column, dtype in COLUMNS]
+        # rows being appended are complete only up to the index
+        rows = min(os.path.getsize(path) // dtype.itemsize
+                   if os.path.exists(path) else 0
+                   for _, dtype, path in paths)
+        columns = {}
+        for column, dtype, path in paths:
+            if rows:
+                columns[column] = np.memmap(path, dtype=dtype, mode="r",
+                                            shape=(rows,))
+            else:
+                columns[column] = np.empty(0, dtype=dtype)
+        return columns
+
+    def scan(self, station_id, start=None, end=None, fields=READING_FIELDS,
+             limit=None):
+        """Scan
+
+        The station readings between start and end as float64
+        columns in chronological order, NaN where missing. Only
+        the days in the range are mapped, and only the selected
+        columns are read.
+
+        :param station_id: The station id
+        :param start: The first collected_at, inclusive
+        :param end: The last collected_at, inclusive
+        :param fields: The READING_FIELDS returned
+        :param limit: Max number of rows
+
+        :return: A dict with the collected_at and fields arrays
+        :rtype: dict
+        """
+        parts = dict((column, []) for column in ("collected_at",) +
+                     tuple(fields))
+        rows = 0
+        for day in self.days(station_id, start, end):
+            if limit is not None and rows >= limit:
+                break
+            columns = self.day(station_id, day)
+            collected_at = columns["collected_at"]
+            selected = slice(None)
+            day_start = _day_start(day)
+            if (start is not None and start > day_start) or \
+                    (end is not None and end < day_start + 86400):
+                mask = np.ones(len(collected_at), dtype=bool)
+                if start is not None:
+                    mask &= collected_at >= start
+                if end is not None:
+                    mask &= collected_at <= end
+                selected = mask
+            for column in parts:
+                parts[column].append(columns[column][selected])
+            rows += len(parts["collected_at"][-1])
+
+        result = {}
+        for column, values in parts.items():
+            values = np.concatenate(values).astype(np.float64) if values \
+                else np.empty(0)
+            if column == "bh1750_illuminance":
+                values[values == MISSING_U2] = np.nan
+            result[column] = values
+
+        order = result["collected_at"]
+        if len(order) > 1 and np.any(order[1:] < order[:-1]):
+            order = np.argsort(order, kind="mergesort")
+            result = dict((column, values[order])
+                          for column, values in result.items())
+        if limit is not None:
+            result = dict((column, values[:limit])
+                          for column, values in result.items())
+        return result
+
+    def readings_array(self, station_id, start=None, end=None, limit=None):
+        """The readings as a (rows, 1 + len(READING_FIELDS)) float64 array
+        of the collected_at and READING_FIELDS columns"""
+        columns = self.scan(station_id, start, end, limit=limit)
+        return np.column_stack([columns["collected_at"]] +
+                               [columns[f] for f in READING_FIELDS])
+
+    def readings(self, station_id, start=None, end=None, limit=None):
+        return [tuple(row) for row in
+                self.readings_array(station_id, start, end, limit).tolist()]
+
+    def outputs(self, station_id, start=None, end=None, limit=None):
+        return []
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Storage interface
+
+Station readings and AquaCrop outputs are stored by station id and
+collected_at (seconds since the epoch), the storage backends only
+have to implement the batch inserts and the range queries.
+
+The station times are UTC: the stations and the simulator send their
+collected_at in UTC and every timestamp of the server is read as UTC,
+the storage, the latency metrics and the replays alike.
+"""
+
+import time
+import calendar
+import threading
+from datetime import datetime
+
+READING_FIELDS = ("bmp180_temp", "bmp180_alt", "bmp180_press",
+                  "ds18b20_temp", "dht22_temp", "dht22_humid",
+                  "bh1750_illuminance", "analog_soil_moisture")
+
+OUTPUT_FIELDS = ("eto", "etc", "precipitation",
+                 "potential_productivity", "obtainable_productivity")
+
+COLLECTED_AT_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%m/%d/%YT%H:%M:%S")
+
+
+def parse_collected_at(collected_at):
+    """Parse collected at
+
+    Converts the station collected_at into seconds since the epoch,
+    the NodeMCU and the simulator formats are accepted, in UTC.
+
+    :param collected_at: The collected_at string, datetime or timestamp
+    :type collected_at: str, datetime, int or float
+
+    :return: Seconds since the epoch, now when it is None
+    :rtype: float
+    """
+    if collected_at is None:
+        return time.time()
+    if isinstance(collected_at, (int, float)):
+        return float(collected_at)
+    if isinstance(collected_at, datetime):
+        return calendar.timegm(collected_at.timetuple()) + \
+            collected_at.microsecond / 1e6
+
+    for date_format in COLLECTED_AT_FORMATS:
+        try:
+            return float(calendar.timegm(
+                datetime.strptime(collected_at, date_format).timetuple()))
+        except ValueError:
+            pass
+    raise ValueError("collected_at %r does not match %s" %
+                     (collected_at, " or ".join(COLLECTED_AT_FORMATS)))
+
+
+class Storage(object):
+    """Storage
+
+    Base class of the storage backends, rows are tuples of
+    (station_id, collected_at) followed by the READING_FIELDS
+    or the OUTPUT_FIELDS values.
+    """
+
+    def insert_readings(self, rows):
+        """Inserts a batch of raw readings rows, keeping
+        the ones with the same station id and collected_at"""
+        raise NotImplementedError
+
+    def insert_outputs(self, rows):
+        """Inserts a batch of model outputs rows, replacing
+        the ones with the same station id and collected_at"""
+        raise NotImplementedError
+
+    def readings(self, station_id, start=None, end=None, limit=None):
+        """Range query of the station raw readings
+
+        :param station_id: The station id
+        :param start: The first collected_at, inclusive
+        :param end: The last collected_at, inclusive
+        :param limit: Max number of rows
+
+        :return: (collected_at, READING_FIELDS...) tuples
+         in chronological order
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def outputs(self, station_id, start=None, end=None, limit=None):
+        """Range query of the station model outputs
+
+        :return: (collected_at, OUTPUT_FIELDS...) tuples
+         in chronological order
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def stations(self):
+        """The ids of the stations with readings"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class StorageWriter(object):
+    """Storage Writer
+
+    Buffers the enriched station readings and writes them
+    to the storage in batches.
+
+    :param storage: The storage backend
+    :param batch_size: Rows buffered before a write
+
+    :type storage: Storage
+    :type batch_size: int
+    """
+
+    def __init__(self, storage, batch_size=500):
+        self.storage = storage
+        self.batch_size = batch_size
+        self._readings = []
+        self._outputs = []
+        self._lock = threading.Lock()
+        self.errors = 0
+        self._failed = False
+
+    def __len__(self):
+        return len(self._readings) + len(self._outputs)
+
+    def add(self, data):
+        """Add
+
+        Buffers the raw reading and, when present,
+        the model outputs of a station message
+
+        :param data: A station message
+        :type data: dict
+        """
+        key = (str(data.get("id")), parse_collected_at(data.get("collected_at")))
+        with self._lock:
+            self._readings.append(key + tuple(data.get(f) for f in READING_FIELDS))
+            if all(f in data for f in OUTPUT_FIELDS):
+                self._outputs.append(key + tuple(data[f] for f in OUTPUT_FIELDS))
+            full = len(self._readings) >= self.batch_size
+        # after a failed write the rows wait for the periodic flush
+        if full and not self._failed:
+            try:
+                self.flush()
+            except Exception as e:
+                print("Storage error: %s" % e)
+
+    def flush(self):
+        """Writes the buffered rows
+
+        The rows of a failed write are buffered again, ahead of
+        the ones added since, and the error is raised
+
+        :return: The number of rows written
+        :rtype: int
+        """
+        with self._lock:
+            readings, self._readings = self._readings, []
+            outputs, self._outputs = self._outputs, []
+        written = 0
+        try:
+            if readings:
+                self.storage.insert_readings(readings)
+                written, readings = len(readings), []
+            if outputs:
+                self.storage.insert_outputs(outputs)
+                written += len(outputs)
+        except Exception:
+            with self._lock:
+                self._readings[:0] = readings
+                self._outputs[:0] = outputs
+            self.errors += 1
+            self._failed = True
+            raise
+        self._failed = False
+        return written
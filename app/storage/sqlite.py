@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""SQLite storage
+
+Embedded storage backend, the database runs in WAL mode so the
+dashboard queries do not block the worker inserts.
+
+Every raw reading is kept, the stations and the load generator send
+many readings in the same second, and the outputs keep the last one
+of each station and collected_at, replaced by the replays.
+"""
+
+import sqlite3
+import threading
+
+from .base import Storage, READING_FIELDS, OUTPUT_FIELDS
+
+
+class SQLiteStorage(Storage):
+    """SQLite Storage
+
+    :param path: The database file, ':memory:' for a memory database
+    :type path: str
+    """
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self.__migrate_readings()
+            self.__create_readings()
+            self.__create_table("outputs", OUTPUT_FIELDS)
+
+    def __columns(self, fields):
+        return "station_id TEXT NOT NULL, collected_at REAL NOT NULL, %s" % \
+            ", ".join("%s REAL" % f for f in fields)
+
+    def __create_readings(self):
+        # the (station, time) index of the range queries is not unique,
+        # the readings of the same second are all kept
+        self._conn.execute("CREATE TABLE IF NOT EXISTS readings (%s)" %
+                           self.__columns(READING_FIELDS))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS readings_station_time "
+                           "ON readings (station_id, collected_at)")
+
+    def __migrate_readings(self):
+        # the first readings table had a (station, time) primary key
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE "
+                                 "type = 'table' AND name = 'readings'"
+                                 ).fetchone()
+        if row is None or "PRIMARY KEY" not in row[0]:
+            return
+        self._conn.execute("ALTER TABLE readings RENAME TO readings_old")
+        self.__create_readings()
+        self._conn.execute("INSERT INTO readings SELECT * FROM readings_old")
+        self._conn.execute("DROP TABLE readings_old")
+
+    def __create_table(self, table, fields):
+        # the primary key is the (station, time) index of the range queries
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS %s (%s, "
+            "PRIMARY KEY (station_id, collected_at)) WITHOUT ROWID" %
+            (table, self.__columns(fields)))
+
+    def __insert(self, table, fields, rows, replace=False):
+        sql = "INSERT %sINTO %s VALUES (%s)" % \
+              ("OR REPLACE " if replace else "", table,
+               ", ".join("?" * (len(fields) + 2)))
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    def __select(self, table, fields, station_id, start, end, limit):
+        sql = "SELECT collected_at, %s FROM %s WHERE station_id = ?" % \
+              (", ".join(fields), table)
+        params = [str(station_id)]
+        if start is not None:
+            sql += " AND collected_at >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND collected_at <= ?"
+            params.append(end)
+        # the readings of the same second in their insert order
+        sql += " ORDER BY collected_at%s" % \
+               (", rowid" if table == "readings" else "")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def insert_readings(self, rows):
+        self.__insert("readings", READING_FIELDS, rows)
+
+    def insert_outputs(self, rows):
+        self.__insert("outputs", OUTPUT_FIELDS, rows, replace=True)
+
+    def readings(self, station_id, start=None, end=None, limit=None):
+        return self.__select("readings", READING_FIELDS,
+                             station_id, start, end, limit)
+
+    def outputs(self, station_id, start=None, end=None, limit=None):
+        return self.__select("outputs", OUTPUT_FIELDS,
+                             station_id, start, end, limit)
+
+    def stations(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT station_id FROM readings ORDER BY station_id")]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
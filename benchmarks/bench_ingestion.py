@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark of the worker ingestion path
+
+The payloads go through AsyncMQTTConsumer.on_message, the station
+models and the publishers, with an in-memory client in place of the
+broker and a socket stub that only serializes the emits. The payload
+decode is also measured by wire format.
+"""
+
+import json
+import asyncio
+
+import pytest
+import paho.mqtt.client as mqtt
+
+from app.codec import FORMATS, codecs, decode
+from app.registry import AquaCropRegistry
+from app.ingestion import (AsyncMQTTConsumer, IngestionPipeline,
+                           process_payload)
+
+
+class ClientStub(object):
+    """The paho client attributes used by the consumer"""
+    on_message = None
+
+
+class SocketStub(object):
+    def __init__(self):
+        self.sent = 0
+
+    def emit(self, event, data):
+        self.sent += len(data)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+def bench_on_message(benchmark, loop, aquacrop_data, payloads):
+    registry = AquaCropRegistry(aquacrop_data)
+    socket = SocketStub()
+
+    async def publish(index, data):
+        socket.emit('stations', json.dumps(data))
+
+    pipeline = IngestionPipeline(lambda payload: process_payload(registry,
+                                                                 payload),
+                                 publish, queue_size=len(payloads),
+                                 publishers=2)
+    client = ClientStub()
+    consumer = AsyncMQTTConsumer(client, pipeline, loop=loop)
+    tasks = pipeline.tasks()
+    messages = []
+    for payload in payloads:
+        msg = mqtt.MQTTMessage(topic=b"weather_data")
+        msg.payload = payload
+        messages.append(msg)
+
+    async def drain(expected):
+        while pipeline.published < expected:
+            await asyncio.sleep(0)
+
+    def run():
+        expected = pipeline.published + len(messages)
+        for msg in messages:
+            client.on_message(client, None, msg)
+        loop.run_until_complete(drain(expected))
+
+    benchmark(run)
+    for task in tasks:
+        task.cancel()
+    assert pipeline.errors == 0
+
+
+@pytest.mark.parametrize("wire_format", FORMATS)
+def bench_decode(benchmark, payloads, wire_format):
+    if wire_format not in codecs:
+        pytest.skip("%s is not installed" % wire_format)
+    codec = codecs[wire_format]
+    encoded = [codec.dumps(json.loads(payload.decode("utf-8")))
+               for payload in payloads]
+
+    def run():
+        for payload in encoded:
+            decode(payload)
+
+    benchmark(run)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the labmet scientific kernels"""
+
+from datetime import timedelta
+
+import numpy as np
+
+from labmet.radiation import (ExtraterrestrialIrradiance, RadiationGrid,
+                              radiation_cache)
+from labmet.evapotranspiration import (ThornthwaiteETo,
+                                       ThornthwaiteCamargoETo,
+                                       ThornthwaiteEToEngine)
+from labmet.fao_aquacrop_model.fixes.temperature_fix import (
+    WinterTemperatureFixCIII, SummerTemperatureFixCIII, TemperatureFixCIV)
+from labmet.fao_aquacrop_model.prodfao import (PotentialProductivity,
+                                               AquaCropModel)
+from labmet.thornthwaitewb import (ThornthwaiteWaterBalance,
+                                  thornthwaite_water_balance_series,
+                                  thornthwaite_water_balance_cycle)
+
+TEMPERATURES = [t / 2.0 for t in range(-10, 80)]
+
+
+def bench_ho(benchmark, day):
+    benchmark(ExtraterrestrialIrradiance(day, -22.9).ho)
+
+
+def bench_ho_cached(benchmark, day):
+    radiation_cache.get(day, -22.9)
+    benchmark(radiation_cache.get, day, -22.9)
+
+
+def bench_radiation_grid_build(benchmark):
+    # 0.1 degree grid
+    benchmark(RadiationGrid.build, np.linspace(-90, 90, 1801))
+
+
+def bench_radiation_grid_interpolate_1m(benchmark):
+    grid = RadiationGrid.build(np.linspace(-60, 60, 241))
+    rng = np.random.RandomState(804)
+    lat = rng.uniform(-60, 60, 1000000)
+    day = rng.randint(1, 367, 1000000)
+    benchmark(grid.interpolate, "ho", lat, day)
+
+
+def bench_thornthwaite_eto_day(benchmark):
+    benchmark(ThornthwaiteETo(24, 12.2, 31, 21).eto_day)
+
+
+def bench_thornthwaite_camargo_eto_day(benchmark):
+    benchmark(ThornthwaiteCamargoETo(29, 18, 12.2, 31, 21).eto_day)
+
+
+def bench_eto_engine_eto_day_1m(benchmark):
+    rng = np.random.RandomState(804)
+    temperature = rng.uniform(0, 35, 1000000)
+    photoperiod = rng.uniform(9, 15, 1000000)
+    benchmark(ThornthwaiteEToEngine(21).eto_day, temperature, photoperiod, 30)
+
+
+def _temperature_fixes(fix_class):
+    for temperature in TEMPERATURES:
+        fix = fix_class(temperature)
+        fix.cloudy_days_fix()
+        fix.clear_days_fix()
+
+
+def bench_winter_temperature_fix_c3(benchmark):
+    benchmark(_temperature_fixes, WinterTemperatureFixCIII)
+
+
+def bench_summer_temperature_fix_c3(benchmark):
+    benchmark(_temperature_fixes, SummerTemperatureFixCIII)
+
+
+def bench_temperature_fix_c4(benchmark):
+    benchmark(_temperature_fixes, TemperatureFixCIV)
+
+
+def bench_potential_productivity(benchmark):
+    fix = SummerTemperatureFixCIII(24)
+    productivity = PotentialProductivity(ho=950.0,
+                                         temp_cloudy_days_fix=fix.cloudy_days_fix(),
+                                         temp_clear_days_fix=fix.clear_days_fix(),
+                                         n=6.0, N=12.0)
+    benchmark(productivity.potential_productivity, 0.5, 0.6, 0.7)
+
+
+def bench_aqua_crop(benchmark, aquacrop_data, day):
+    model = AquaCropModel(**aquacrop_data)
+    benchmark(model.aqua_crop, 25.0, 24.0, 500, day)
+
+
+def bench_aqua_crop_1000(benchmark, aquacrop_data, day):
+    model = AquaCropModel(**aquacrop_data)
+    readings = [(5.0 + i % 45, 10.0 + i % 25, i % 1000,
+                 day + timedelta(minutes=i)) for i in range(1000)]
+
+    def run():
+        for soil_moisture, temperature, illuminance, date in readings:
+            model.aqua_crop(soil_moisture, temperature, illuminance, date)
+    benchmark(run)
+
+
+def bench_aqua_crop_batch_1000(benchmark, aquacrop_data, day):
+    model = AquaCropModel(**aquacrop_data)
+    i = np.arange(1000)
+    dates = [day + timedelta(minutes=int(m)) for m in i]
+    benchmark(model.aqua_crop_batch, 5.0 + i % 45, 10.0 + i % 25, i % 1000,
+              dates)
+
+
+def bench_thornthwaite_water_balance_year(benchmark):
+    precipitation = [180, 160, 140, 70, 50, 30, 20, 30, 60, 120, 150, 200]
+    eto = [120, 110, 105, 80, 60, 45, 50, 70, 90, 105, 115, 125]
+
+    def run():
+        balance = ThornthwaiteWaterBalance(100)
+        for p, e in zip(precipitation, eto):
+            balance.thornthwaite_water_balance(p, e)
+    benchmark(run)
+
+
+def bench_thornthwaite_water_balance_series(benchmark):
+    # 30 years of months of 500 sites
+    rng = np.random.RandomState(804)
+    precipitation = rng.uniform(0, 200, (500, 360))
+    eto = rng.uniform(20, 150, (500, 360))
+    benchmark(thornthwaite_water_balance_series, 100, precipitation, eto)
+
+
+def bench_thornthwaite_water_balance_cycle(benchmark):
+    # climatological balance of 2000 sites
+    rng = np.random.RandomState(804)
+    precipitation = rng.uniform(0, 200, (2000, 12))
+    eto = rng.uniform(20, 150, (2000, 12))
+    benchmark(thornthwaite_water_balance_cycle, 100, precipitation, eto)
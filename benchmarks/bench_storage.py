@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark of the season scans and of the station checkpoints
+
+A station season of one reading by minute, read back from the
+SQLite storage and from the columnar sensor archive, and the
+checkpoint of the models of 10000 stations.
+"""
+
+import numpy as np
+import pytest
+
+from app import checkpoint
+from app.registry import AquaCropRegistry
+from app.storage import SensorArchive, create_storage, READING_FIELDS
+
+SEASON_START = 1464739200  # 2016-06-01
+SEASON_READINGS = 130 * 24 * 60
+
+
+@pytest.fixture(scope="module")
+def season_rows():
+    rng = np.random.RandomState(0)
+    values = rng.uniform(0, 100, (SEASON_READINGS, len(READING_FIELDS)))
+    return [("1", float(SEASON_START + 60 * i)) + tuple(row)
+            for i, row in enumerate(values.tolist())]
+
+
+@pytest.fixture(scope="module")
+def sqlite_storage(tmpdir_factory, season_rows):
+    storage = create_storage("sqlite:///%s" %
+                             tmpdir_factory.mktemp("sqlite").join("labmet.db"))
+    storage.insert_readings(season_rows)
+    yield storage
+    storage.close()
+
+
+@pytest.fixture(scope="module")
+def archive(tmpdir_factory, season_rows):
+    archive = SensorArchive(str(tmpdir_factory.mktemp("archive")))
+    archive.insert_readings(season_rows)
+    return archive
+
+
+def bench_season_sqlite(benchmark, sqlite_storage):
+    rows = benchmark(lambda: np.array(sqlite_storage.readings("1")))
+    assert len(rows) == SEASON_READINGS
+
+
+def bench_season_archive(benchmark, archive):
+    columns = benchmark(archive.scan, "1")
+    assert len(columns["collected_at"]) == SEASON_READINGS
+
+
+def bench_season_archive_column(benchmark, archive):
+    # the soil moisture mean of each day, on the mapped columns
+    def daily_means():
+        return [archive.day("1", day)["analog_soil_moisture"].mean()
+                for day in archive.days("1")]
+
+    assert len(benchmark(daily_means)) == 130
+
+
+@pytest.fixture(scope="module")
+def registry():
+    from conftest import AQUACROP_DATA
+
+    registry = AquaCropRegistry(AQUACROP_DATA, maxsize=None)
+    for station_id in range(10000):
+        registry.get(station_id)
+    return registry
+
+
+def bench_checkpoint_dumps(benchmark, registry):
+    data = benchmark(lambda: checkpoint.dumps(registry.states()))
+    assert len(checkpoint.loads(data)) == 10000
+
+
+def bench_checkpoint_loads(benchmark, registry):
+    data = checkpoint.dumps(registry.states())
+    assert len(benchmark(checkpoint.loads, data)) == 10000
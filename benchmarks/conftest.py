@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# default --benchmark-compare-fail of a --benchmark-compare run
+REGRESSION_THRESHOLD = "median:20%"
+
+AQUACROP_DATA = {"culture_name": "potato",
+                 "ky": 1.1,
+                 "lat": 51.5044968,
+                 "eto_culture": 0.8,
+                 "avg_year_temp": 19,
+                 "n_days": 130,
+                 "peak_l_a_index": 3,
+                 "awc": 35}
+
+
+def _baselines(config):
+    """The JSON baselines saved on this machine"""
+    from pytest_benchmark.utils import get_machine_id
+
+    storage = config.getoption("benchmark_storage")
+    if storage.startswith("file://"):
+        storage = storage[len("file://"):]
+    directory = os.path.join(os.path.abspath(storage), get_machine_id())
+    if not os.path.isdir(directory):
+        return directory, []
+    return directory, [name for name in os.listdir(directory)
+                       if name.endswith(".json")]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    from pytest_benchmark.utils import parse_compare_fail
+
+    if not config.getoption("benchmark_compare", None):
+        return
+    # the timings only compare on the same machine, the baselines are
+    # saved by each machine and a compare without one is an error
+    directory, baselines = _baselines(config)
+    if not baselines:
+        raise pytest.UsageError(
+            "No benchmark baseline in %s, save one on this machine "
+            "first: pytest --benchmark-save=baseline" % directory)
+    if not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = \
+            [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+
+@pytest.fixture
+def aquacrop_data():
+    return dict(AQUACROP_DATA)
+
+
+@pytest.fixture
+def day():
+    return datetime(2016, 6, 21, 12)
+
+
+@pytest.fixture
+def payloads():
+    """1000 station readings of 50 stations, as MQTT payloads"""
+    return [json.dumps({
+        "id": i % 50,
+        "collected_at": "06/21/2016T%02d:%02d:00" % (i // 60 % 24, i % 60),
+        "bmp180_temp": 24.1,
+        "bmp180_alt": 780.0,
+        "bmp180_press": 1.7,
+        "ds18b20_temp": 10.0 + i % 25,
+        "dht22_temp": 24.3,
+        "dht22_humid": 60.0,
+        "bh1750_illuminance": i % 1000,
+        "analog_soil_moisture": 5.0 + i % 45
+    }).encode("utf-8") for i in range(1000)]
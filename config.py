@@ -19,9 +19,53 @@ class Config:
     MQTT_KEEP_ALIVE = 60
     MQTT_TOPIC = "weather_data"
     MQTT_QOS = 0
+    # the server subscribes and runs the station models itself,
+    # instead of receiving the readings of worker.py
+    MQTT_INGESTION = os.environ.get('MQTT_INGESTION') == '1'
+    # file of the in-process station models state, None to disable
+    MODEL_CHECKPOINT = os.environ.get('MODEL_CHECKPOINT') or None
+
+    # dashboard updates are sent in one frame every window seconds
+    STATION_BATCH_WINDOW = float(os.environ.get('STATION_BATCH_WINDOW') or
+                                 0.25)
+    # queue shared by many Socket.IO servers, redis://, amqp:// or the
+    # labmet://host:port broker of manage.py backplane, None for one server
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    SOCKETIO_CHANNEL = 'labmet'
+    # format of the dashboard frames, json or msgpack, see app.codec
+    BROADCAST_FORMAT = os.environ.get('BROADCAST_FORMAT') or 'json'
+    # max station rooms a dashboard can join
+    MAX_SUBSCRIPTIONS = 10
+
+    # stations with their own latency histograms in /metrics
+    METRICS_MAX_STATIONS = 100
+
+    # station readings and model outputs storage, sqlite:// is in memory
+    STORAGE_URL = os.environ.get('STORAGE_URL') or \
+        'sqlite:///' + os.path.join(basedir, 'labmet.db')
+
+    # max points returned by the history api
+    HISTORY_MAX_POINTS = 5000
+
+    # alert rules evaluated on each station reading, see app.alerts
+    ALERT_RULES = [
+        {"type": "sustained", "name": "very_dry",
+         "metric": "soil_moisture_mm", "below": 10.0, "duration": 600,
+         "message": "Station {station}: alert is very dry, "
+                    "{value:.1f} mm of soil moisture"},
+        {"type": "threshold", "name": "productivity_loss",
+         "metric": "productivity_ratio", "below": 0.5,
+         "message": "Station {station}: obtainable productivity is "
+                    "{value:.0%} of the potential"},
+        {"type": "threshold", "name": "water_stress",
+         "metric": "stress_ratio", "below": 0.5,
+         "message": "Station {station}: ETc is {value:.0%} of the ETo"},
+    ]
 
     # notification app mobile
     NOTIFICATIONKEY = os.environ.get('NOTIFICATIONKEY') or None
+    NOTIFICATION_URL = os.environ.get('NOTIFICATION_URL') or \
+        'https://api.ionic.io'
 
 
 config = {'default': Config}
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+import numpy as np
+
+from labmet.labmetExceptions.labmetExceptions import InputTypeException
+from labmet.evapotranspiration.ETo.thornthwaite import (ThornthwaiteETo,
+                                                        ThornthwaiteCamargoETo)
+
+
+def _round2(values, exact):
+    """Rounds to 2 decimals as the builtin round
+
+    numpy rounds values * 100, which can fall on the other side of
+    a tie, so the values close to a tie are computed again by the
+    exact function of their index and rounded by the builtin round.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.round(values, 2)
+    scaled = values * 100.0
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= \
+        1e-9 * np.maximum(1.0, np.abs(scaled))
+    for index in zip(*np.nonzero(near_tie)):
+        result[index] = round(exact(index), 2)
+    return result
+
+
+class ThornthwaiteEToEngine(object):
+    """Thornthwaite ETo engine
+
+    The ThornthwaiteETo of one site, whose heat index (I) and "a"
+    exponent depend only on its average annual temperature, so they
+    are computed once by site instead of by ETo. The ETo methods take
+    numbers, or arrays of any broadcastable shapes, and return the
+    same values as ThornthwaiteETo, with both the Thornthwaite and
+    the Thornthwaite Camargo variants.
+
+    """
+
+    def __init__(self, avg_annual_temp):
+        """Class init method
+
+        :param avg_annual_temp: Average annual temperature
+        :type avg_annual_temp: int or float
+        """
+        site = ThornthwaiteETo(0, 12, 30, avg_annual_temp)
+        self.avg_annual_temp = site.avg_annual_temp
+        self.i = site.h_i()
+        self.a_exp = site.a()
+        self.__temp_max_etp = 26.5
+
+    @staticmethod
+    def period_validation(n_days):
+        """Checks that each number of days is in 1..31"""
+        n_days = np.asarray(n_days)
+        if not np.all((1 <= n_days) & (n_days <= 31)):
+            raise InputTypeException('The number of days in '
+                                     'the period must be greater '
+                                     'than 1 and lower than 31')
+
+    def __eto_scalar(self, avg_temp):
+        if 0 <= avg_temp <= self.__temp_max_etp:
+            return round(16 * math.pow((10 * avg_temp / self.i), self.a_exp), 2)
+        return round(-415.85 + ((32.24 * avg_temp) -
+                                (0.43 * math.pow(avg_temp, 2))), 2)
+
+    def eto(self, avg_temp):
+        """Potential evapotranspiration of a standard month
+
+        :param avg_temp: Period average air temperature
+        :type avg_temp: int, float or array
+
+        :return: The ETo
+        :rtype: float or array
+        """
+        if np.ndim(avg_temp) == 0:
+            return self.__eto_scalar(float(avg_temp))
+
+        avg_temp = np.asarray(avg_temp, dtype=np.float64)
+        in_range = (0 <= avg_temp) & (avg_temp <= self.__temp_max_etp)
+        with np.errstate(invalid='ignore'):
+            eto = np.where(in_range,
+                           16 * np.power(10 * avg_temp / self.i, self.a_exp),
+                           -415.85 + ((32.24 * avg_temp) -
+                                      (0.43 * avg_temp * avg_temp)))
+        return _round2(eto, lambda index: self.__eto_scalar(
+            float(avg_temp[index])))
+
+    @staticmethod
+    def std_month_fix(photoperiod, n_days):
+        """Standard month fix factor
+
+        :param photoperiod: Period average photoperiod
+        :param n_days: Number of days
+        """
+        if np.ndim(photoperiod) == 0 and np.ndim(n_days) == 0:
+            return round(float(photoperiod) / 12.0 * n_days / 30.0, 2)
+        fix = np.asarray(photoperiod, dtype=np.float64) / 12.0 * \
+            np.asarray(n_days) / 30.0
+        return _round2(fix, lambda index: float(fix[index]))
+
+    def eto_month(self, avg_temp, photoperiod, n_days):
+        """ETo of the month
+
+        :param avg_temp: Period average air temperature
+        :param photoperiod: Period average photoperiod
+        :param n_days: Number of days
+
+        :return: The ETo of each month
+        :rtype: float or array
+        """
+        self.period_validation(n_days)
+        eto = self.std_month_fix(photoperiod, n_days) * self.eto(avg_temp)
+        if np.ndim(eto) == 0:
+            return round(eto, 2)
+        return _round2(eto, lambda index: float(eto[index]))
+
+    def eto_day(self, avg_temp, photoperiod, n_days):
+        """ETo of a day
+
+        :param avg_temp: Period average air temperature
+        :param photoperiod: Period average photoperiod
+        :param n_days: Number of days
+
+        :return: The ETo of a day of each period
+        :rtype: float or array
+        """
+        self.period_validation(n_days)
+        if np.ndim(n_days):
+            n_days = np.asarray(n_days)
+        eto = self.std_month_fix(photoperiod, n_days) * \
+            self.eto(avg_temp) / n_days
+        if np.ndim(eto) == 0:
+            return round(eto, 2)
+        return _round2(eto, lambda index: float(eto[index]))
+
+    @staticmethod
+    def effective_temperature(t_max, t_min):
+        """Effective temperature of the Thornthwaite Camargo method
+
+        :param t_max: The maximum temperature
+        :param t_min: The minimum temperature
+        """
+        if np.ndim(t_max) == 0 and np.ndim(t_min) == 0:
+            return ThornthwaiteCamargoETo.effective_temperature(t_max, t_min)
+        t_max = np.asarray(t_max, dtype=np.float64)
+        t_min = np.asarray(t_min, dtype=np.float64)
+        swap = t_max < t_min
+        t_max, t_min = np.where(swap, t_min, t_max), np.where(swap, t_max, t_min)
+        tef = 0.36 * (3 * t_max - t_min)
+        return _round2(tef, lambda index: float(tef[index]))
+
+    def camargo_eto_month(self, max_temp, min_temp, photoperiod, n_days):
+        """Thornthwaite Camargo ETo of the month"""
+        return self.eto_month(self.effective_temperature(max_temp, min_temp),
+                              photoperiod, n_days)
+
+    def camargo_eto_day(self, max_temp, min_temp, photoperiod, n_days):
+        """Thornthwaite Camargo ETo of a day"""
+        return self.eto_day(self.effective_temperature(max_temp, min_temp),
+                            photoperiod, n_days)
+
+
+_engines = {}
+
+
+def eto_engine(avg_annual_temp):
+    """The ThornthwaiteEToEngine of an average annual temperature,
+    built once and shared by the sites with the same temperature"""
+    key = float(avg_annual_temp)
+    engine = _engines.get(key)
+    if engine is None:
+        engine = _engines[key] = ThornthwaiteEToEngine(key)
+    return engine
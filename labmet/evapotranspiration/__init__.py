@@ -1,2 +1,3 @@
 from labmet.evapotranspiration.ETo.thornthwaite import *
 from labmet.evapotranspiration.ETc.ETc import *
+from labmet.evapotranspiration.ETo.engine import *
@@ -3,5 +3,6 @@ from labmet.fao_aquacrop_model.fixes.temperature_fix import *
 from labmet.fao_aquacrop_model.fixes.leaf_area_fix import *
 from labmet.fao_aquacrop_model.fixes.harvest_fix import *
 from labmet.fao_aquacrop_model.fixes.input_variable_fix import *
+from labmet.fao_aquacrop_model.culture_profile import *
 
 from labmet.fao_aquacrop_model.prodfao import *
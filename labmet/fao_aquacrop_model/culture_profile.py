@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compiled culture profiles
+
+Copyright 2016, Lab804
+
+.. module: labmet.fao_aquacrop_model.culture_profile
+   :platform: Unix, Windows, macOS
+   :synopsis: Immutable records with the culture coefficients
+    used by the AquaCrop model.
+
+"""
+
+from collections import namedtuple
+
+from labmet.evapotranspiration.ETc.ETc import ETcKc, ETcKcTable
+from labmet.fao_aquacrop_model.fixes.harvest_fix import HarvestedPartFix
+from labmet.fao_aquacrop_model.fixes.leaf_area_fix import LeafAreaIndexFix
+
+__author__ = 'joaotrevizoliesteves, Murilo Ijanc'
+__copyright__ = "Copyright 2015, Lab804"
+__license__ = "BSD"
+__version__ = "0.1"
+
+
+FixRange = namedtuple("FixRange", ["minimum", "average", "maximum"])
+
+KcStages = namedtuple("KcStages", ["establishment", "vegetative_growth",
+                                   "flowering", "fruiting", "ripening"])
+
+CultureProfile = namedtuple("CultureProfile",
+                            ["name", "ky", "peak_l_a_index",
+                             "harvested_part", "harvest_fix", "humidity_fix",
+                             "leaf_area_fix", "kc"])
+
+_profiles = {}
+
+
+def compile_culture_profile(culture_name, peak_l_a_index, ky):
+    """Compile culture profile
+
+    Builds the culture profile with the harvested part, humidity
+    and leaf area index fixes and the Kc of each life stage.
+
+    ..note:: The Kc stages are None for the cultures without
+             a Kc table
+
+    :param culture_name: The name of the culture
+    :param peak_l_a_index: The peak leaf area index
+    :param ky: The culture coefficient
+
+    :type culture_name: str
+    :type peak_l_a_index: int or float
+    :type ky: float
+
+    :return: The culture profile
+    :rtype: CultureProfile
+    """
+    harvested_part_fix = HarvestedPartFix(culture_name)
+    harvest = harvested_part_fix.harvested_part_fix()
+    humidity = harvested_part_fix.humidity_fix()
+
+    kc = None
+    if culture_name in ETcKcTable._cultures:
+        etc_kc = ETcKc(culture_name)
+        averages = etc_kc.crop_coefficients()
+        kc = KcStages(**dict(
+            (stage, FixRange(minimum=etc_kc.culture[stage][0],
+                             average=averages[stage],
+                             maximum=etc_kc.culture[stage][-1]))
+            for stage in KcStages._fields))
+
+    return CultureProfile(
+        name=culture_name,
+        ky=ky,
+        peak_l_a_index=peak_l_a_index,
+        harvested_part=harvest["part"],
+        harvest_fix=FixRange(minimum=harvest["minimum"],
+                             average=harvest["average"],
+                             maximum=harvest["maximum"]),
+        humidity_fix=FixRange(minimum=humidity["minimum"],
+                              average=humidity["average"],
+                              maximum=humidity["maximum"]),
+        leaf_area_fix=LeafAreaIndexFix(peak_l_a_index).leaf_area_index_fix(),
+        kc=kc)
+
+
+def culture_profile(culture_name, peak_l_a_index, ky):
+    """Culture profile
+
+    Gets the compiled culture profile, the profile is
+    compiled only once for each (culture, peak LAI, ky)
+
+    :param culture_name: The name of the culture
+    :param peak_l_a_index: The peak leaf area index
+    :param ky: The culture coefficient
+
+    :type culture_name: str
+    :type peak_l_a_index: int or float
+    :type ky: float
+
+    :return: The culture profile
+    :rtype: CultureProfile
+    """
+    key = (culture_name, peak_l_a_index, ky)
+    profile = _profiles.get(key)
+    if profile is None:
+        profile = _profiles[key] = compile_culture_profile(*key)
+    return profile
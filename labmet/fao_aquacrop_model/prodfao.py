@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import numpy as np
+
 from labmet.labmetExceptions.labmetExceptions import InputException, InputTypeException
-from labmet.radiation.radiation import ExtraterrestrialIrradiance
+from labmet.radiation.cache import radiation_cache
 from labmet.fao_aquacrop_model.fixes.temperature_fix import *
 from labmet.fao_aquacrop_model.fixes.breathing_fix import BreathingFix
-from labmet.fao_aquacrop_model.fixes.leaf_area_fix import LeafAreaIndexFix
-from labmet.fao_aquacrop_model.fixes.harvest_fix import HarvestedPartFix, HarvestPartFixTable
+from labmet.fao_aquacrop_model.fixes.harvest_fix import HarvestPartFixTable
+from labmet.fao_aquacrop_model.culture_profile import culture_profile
 from labmet.evapotranspiration.ETo.thornthwaite import ThornthwaiteETo
+from labmet.evapotranspiration.ETo.engine import eto_engine
 from datetime import datetime
 
 
@@ -306,12 +309,62 @@ class AquaCropModel(ObtainableProductivity):
 
         ObtainableProductivity.__init__(self, ky)
 
+    def get_state(self):
+        """Get state
+
+        The model state updated by each reading, used to
+        checkpoint the model and to resume it later.
+
+        :return: A dict with the soil_moisture, precipitation,
+         eto and etc values
+        :rtype: dict
+        """
+        return {"soil_moisture": self.soil_moisture,
+                "precipitation": self.precipitation,
+                "eto": self.__eto,
+                "etc": self.__etc}
+
+    def set_state(self, state):
+        """Set state
+
+        Restores a state returned by get_state
+
+        :param state: The model state
+        :type state: dict
+        """
+        self.soil_moisture = state["soil_moisture"]
+        self.precipitation = state["precipitation"]
+        self.__eto = state["eto"]
+        self.__etc = state["etc"]
+
+    @property
+    def culture_profile(self):
+        """Culture profile
+
+        The compiled harvested part, humidity, leaf area
+        index and Kc coefficients of the model culture
+
+        :rtype: CultureProfile
+        """
+        return culture_profile(self.culture_name, self.peak_l_a_index, self.ky)
+
+    @property
+    def eto_engine(self):
+        """ETo engine
+
+        The thornthwaite ETo engine of the location average
+        annual temperature, with its heat index precomputed
+
+        :rtype: ThornthwaiteEToEngine
+        """
+        return eto_engine(self.avg_year_temp)
+
     def __get_radiation_data(self, date=datetime.now()):
         """Get radiation data
 
-        This method calculates the extraterrestrial radiation
+        This method gets the extraterrestrial radiation
         in the latitude point that the culture is established
-        by calling the ExtraterrestrialIrradiance class
+        from the daily radiation cache
 
         :param date: The desired datetime(default=datetime.now())
 
@@ -320,12 +373,10 @@ class AquaCropModel(ObtainableProductivity):
         :return: a dict with the radiation values
         :rtype: dict
         """
-        radiation_data = {"day": date,
-                          "lat": self.lat}
-        extra_radiation = ExtraterrestrialIrradiance(**radiation_data)
+        daily_radiation = radiation_cache.get(date, self.lat)
 
-        return {"radiation": extra_radiation.ho_cal_sqaured_cm(),
-                "photoperiod": extra_radiation.photoperiod()}
+        return {"radiation": daily_radiation.ho_cal,
+                "photoperiod": daily_radiation.photoperiod}
 
     def __set_et(self, photoperiod, temperature):
         """Set Evapotranspiration
@@ -343,14 +394,28 @@ class AquaCropModel(ObtainableProductivity):
         :type temperature: int or float
 
         """
-        eto = ThornthwaiteETo(temperature,
-                              photoperiod,
-                              30,
-                              self.avg_year_temp).eto_day() * self.eto_culture
-        self.__eto = eto
+        self.__eto = self.__get_eto(photoperiod, temperature)
         if self.__etc is None:
             self.__etc = self.__eto
 
+    def __get_eto(self, photoperiod, temperature):
+        """Get Evapotranspiration
+
+        The culture daily evapotranspiration, by the
+        thornthwaite method, without updating the model state
+
+        :param photoperiod: The photoperiod of the desired day
+        :param temperature: The air temperature in ºC
+
+        :type photoperiod: int or float
+        :type temperature: int or float
+
+        :return: The culture ETo in mm . day⁻¹
+        :rtype: float
+        """
+        return self.eto_engine.eto_day(temperature, photoperiod,
+                                       30) * self.eto_culture
+
     @staticmethod
     def __get_temperature_fix(air_temperature, culture_type, culture_season):
         """Get Temperature fix
@@ -421,19 +486,22 @@ class AquaCropModel(ObtainableProductivity):
                                   temp_clear_days_fix=temp_fix["temp_clear_days_fix"],
                                   n_N=self.lux_to_n_N(illuminance))
 
-        breath_fix = BreathingFix(temperature=temperature).breathing_fix()
-        harvest_fix = HarvestedPartFix(self.culture_name).harvested_part_fix()["average"]
-        leaf_area_fix = LeafAreaIndexFix(self.peak_l_a_index).leaf_area_index_fix()
+        breath_fix = self.__get_breathing_fix(temperature)
+        profile = self.culture_profile
 
-        potential_productivity = potential_productivity.potential_productivity(leaf_area_fix,
+        potential_productivity = potential_productivity.potential_productivity(profile.leaf_area_fix,
                                                                                breath_fix,
-                                                                               harvest_fix,
+                                                                               profile.harvest_fix.average,
                                                                                self.n_days,
                                                                                hectometer_sqr_m=True)
         if potential_productivity > 0:
             return potential_productivity
         return 0
 
+    @staticmethod
+    def __get_breathing_fix(temperature):
+        return BreathingFix(temperature=temperature).breathing_fix()
+
     @staticmethod
     def lux_to_n_N(lux):
         """Lux to n/N
@@ -539,6 +607,144 @@ class AquaCropModel(ObtainableProductivity):
                 "potential_productivity": potential_productivity,
                 "obtainable_productivity": obtainable_productivity}
 
+    def aqua_crop_batch(self, soil_moisture, temperature, illuminance, dates,
+                        culture_type="c3", culture_season="summer"):
+        """Aqua Crop batch
+
+        Array version of the aqua_crop method, used to replay a whole
+        series of readings at once. The results are the same as
+        calling aqua_crop for each reading in order.
+
+        The radiation is computed once by day of the year and the
+        temperature fixes once by temperature, the ETo and the
+        productivities are computed as array operations and only
+        the soil moisture recurrence runs reading by reading.
+
+        ..warning: As in aqua_crop the __etc, __eto, precipitation
+                   and soil moisture values are updated inside the
+                   class with the values of the last reading.
+
+        :param soil_moisture: The soil moisture measured in the sensor
+        :param temperature: The air temperature in ºC
+        :param illuminance: The illuminance in lx
+        :param dates: The datetime of each reading
+        :param culture_type: The culture type (c3 or c4)
+        :param culture_season: The season of culture growth (winter or summer)
+
+        :type soil_moisture: sequence of int or float
+        :type temperature: sequence of int or float
+        :type illuminance: sequence of int or float
+        :type dates: sequence of datetime
+        :type culture_type: str
+        :type culture_season: str
+
+        :return: A record array with the eto, etc, precipitation,
+         potential_productivity and obtainable_productivity fields
+        :rtype: numpy.recarray
+        """
+        soil_moisture = np.asarray(soil_moisture, dtype=np.float64)
+        temperature = np.asarray(temperature, dtype=np.float64)
+        illuminance = np.asarray(illuminance, dtype=np.float64)
+        dates = list(dates)
+
+        n = len(dates)
+        if not (soil_moisture.shape == temperature.shape ==
+                illuminance.shape == (n,)):
+            raise InputException("soil_moisture, temperature, illuminance "
+                                 "and dates must have the same length!")
+
+        results = np.recarray(n, dtype=[("eto", np.float64),
+                                        ("etc", np.float64),
+                                        ("precipitation", np.float64),
+                                        ("potential_productivity", np.float64),
+                                        ("obtainable_productivity", np.float64)])
+        if n == 0:
+            return results
+
+        # radiation and photoperiod by day of year
+        day_keys = {}
+        day_index = np.empty(n, dtype=np.intp)
+        day_dates = []
+        for i, date in enumerate(dates):
+            yday = date.timetuple().tm_yday
+            index = day_keys.get(yday)
+            if index is None:
+                index = day_keys[yday] = len(day_dates)
+                day_dates.append(date)
+            day_index[i] = index
+        day_radiation = [self.__get_radiation_data(date=date) for date in day_dates]
+        radiation = np.array([r["radiation"] for r in day_radiation])[day_index]
+
+        # temperature dependent fixes
+        temps, temp_index = np.unique(temperature, return_inverse=True)
+        temp_index = temp_index.reshape(-1)
+        temp_fixes = [self.__get_temperature_fix(air_temperature=t,
+                                                 culture_type=culture_type,
+                                                 culture_season=culture_season)
+                      for t in temps.tolist()]
+        cloudy_fix = np.array([f["temp_cloudy_days_fix"] for f in temp_fixes])[temp_index]
+        clear_fix = np.array([f["temp_clear_days_fix"] for f in temp_fixes])[temp_index]
+        breath_fix = np.array([self.__get_breathing_fix(t)
+                               for t in temps.tolist()])[temp_index]
+
+        # ETo
+        photoperiod = np.array([r["photoperiod"] for r in day_radiation])[day_index]
+        eto = self.eto_engine.eto_day(temperature, photoperiod, 30) * self.eto_culture
+
+        # potential productivity
+        n_N = np.where(illuminance > 20000.0, 1.0, illuminance / 20000.0)
+        profile = self.culture_profile
+        potential_productivity = (
+            ((31.7 + 0.219 * radiation) * cloudy_fix * (1 - n_N) +
+             (107.2 + 0.36 * radiation) * clear_fix * n_N) * self.n_days *
+            profile.leaf_area_fix * breath_fix * profile.harvest_fix.average
+        )
+        potential_productivity[~(potential_productivity > 0)] = 0
+
+        # soil moisture recurrence
+        soil_moisture_reading = self.awc * np.clip(soil_moisture, 0.0, 100.0) / 100.0
+        etc = np.empty(n)
+        precipitation = np.empty(n)
+        obtainable_productivity = np.empty(n)
+
+        awc = self.awc
+        last_etc = self.__etc
+        last_soil_moisture = self.soil_moisture
+        last_precipitation = self.precipitation
+        for i, (eto_i, reading, pot) in enumerate(zip(eto.tolist(),
+                                                       soil_moisture_reading.tolist(),
+                                                       potential_productivity.tolist())):
+            if last_etc is None:
+                last_etc = eto_i
+            obtainable_productivity[i] = self.obtainable_productivity(eto=eto_i,
+                                                                      etc=last_etc,
+                                                                      potential_productivity=pot)
+            variation = reading - last_soil_moisture
+            if reading > eto_i:
+                last_etc = eto_i
+                if variation >= awc:
+                    last_precipitation = awc
+                else:
+                    last_precipitation = variation
+            else:
+                last_precipitation = 0
+                last_etc = reading
+            last_soil_moisture = reading
+            etc[i] = last_etc
+            precipitation[i] = last_precipitation
+
+        self.__eto = eto[-1].item()
+        self.__etc = last_etc
+        self.precipitation = last_precipitation
+        self.soil_moisture = last_soil_moisture
+
+        results.eto = eto
+        results.etc = etc
+        results.precipitation = precipitation
+        results.potential_productivity = potential_productivity
+        results.obtainable_productivity = obtainable_productivity
+        return results
+
 # if __name__ == '__main__':
 #     aquacrop_data = {"culture_name": "potato",
 #                      "ky": 1.1,
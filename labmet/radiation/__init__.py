@@ -1,2 +1,4 @@
 from labmet.radiation.factors import *
 from labmet.radiation.radiation import *
+from labmet.radiation.cache import *
+from labmet.radiation.grid import *
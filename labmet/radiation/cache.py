@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Daily radiation cache
+
+Copyright 2016, Lab804
+
+.. module: labmet.radiation.cache
+   :platform: Unix, Windows, macOS
+   :synopsis: Memoized extraterrestrial irradiance and photoperiod
+    by latitude and day of the year.
+
+"""
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from labmet.labmetExceptions.labmetExceptions import InputTypeException
+from labmet.radiation.radiation import ExtraterrestrialIrradiance
+
+__author__ = 'joaotrevizoliesteves, Murilo Ijanc'
+__copyright__ = "Copyright 2015, Lab804"
+__license__ = "BSD"
+__version__ = "0.1"
+
+
+DailyRadiation = namedtuple("DailyRadiation",
+                            ["ho", "ho_mm", "ho_cal", "photoperiod"])
+
+
+class RadiationCache(object):
+    """Radiation Cache
+
+    The extraterrestrial irradiance and the photoperiod only change
+    with the day of the year and the latitude, so they are computed
+    once for the 366 days of a latitude and kept in a table. Repeated
+    lookups for a station are a dict get and a tuple index.
+
+    :param maxsize: Maximum number of latitude tables kept,
+     the least recently used is dropped first
+    :type maxsize: int
+    """
+
+    _leap_year = datetime(2016, 1, 1)
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._tables = OrderedDict()
+
+    def __len__(self):
+        return len(self._tables)
+
+    @staticmethod
+    def compute(day, lat):
+        """Compute
+
+        Computes the radiation of one day without the cache
+
+        :param day: A given day datetime
+        :param lat: The latitude in decimal degrees
+
+        :type day: datetime
+        :type lat: int or float
+
+        :return: The ho (MJ . m⁻² . day⁻¹), ho_mm (mm . day⁻¹),
+         ho_cal (cal . cm⁻² . day⁻¹) and photoperiod (hours)
+        :rtype: DailyRadiation
+        """
+        extra_radiation = ExtraterrestrialIrradiance(day=day, lat=lat)
+        ho = extra_radiation.ho()
+        return DailyRadiation(ho=ho,
+                              ho_mm=ho / 2.45,
+                              ho_cal=ho / 0.041868,
+                              photoperiod=extra_radiation.photoperiod())
+
+    def table(self, lat):
+        """Latitude table
+
+        The radiation of the 366 days of the year in a latitude,
+        the day of the year n is at the index n - 1.
+
+        ..note:: Near the poles there are days without sunrise, those
+                 are kept as None
+
+        :param lat: The latitude in decimal degrees
+        :type lat: int or float
+
+        :return: A tuple with the DailyRadiation of each day
+        :rtype: tuple
+        """
+        lat = float(lat)
+        table = self._tables.pop(lat, None)
+        if table is None:
+            table = tuple(self.__compute_or_none(self._leap_year +
+                                                 timedelta(days=yday), lat)
+                          for yday in range(366))
+        self._tables[lat] = table
+
+        while len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+        return table
+
+    def get(self, day, lat):
+        """Get the day radiation
+
+        :param day: A given day datetime or day of the year
+        :param lat: The latitude in decimal degrees
+
+        :type day: datetime or int
+        :type lat: int or float
+
+        :return: The radiation of the day
+        :rtype: DailyRadiation
+        """
+        if isinstance(day, datetime):
+            yday = day.timetuple().tm_yday
+        elif isinstance(day, int) and 1 <= day <= 366:
+            yday = day
+        else:
+            raise InputTypeException("The day must be a datetime or a day "
+                                     "of the year between 1 and 366!")
+
+        daily_radiation = self.table(lat)[yday - 1]
+        if daily_radiation is None:
+            daily_radiation = self.compute(self._leap_year +
+                                           timedelta(days=yday - 1), lat)
+        return daily_radiation
+
+    def clear(self):
+        """Drops all the latitude tables"""
+        self._tables.clear()
+
+    def __compute_or_none(self, day, lat):
+        try:
+            return self.compute(day, lat)
+        except ValueError:
+            return None
+
+
+radiation_cache = RadiationCache()
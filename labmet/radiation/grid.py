@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Radiation grid
+
+Copyright 2016, Lab804
+
+.. module: labmet.radiation.grid
+   :platform: Unix, Windows, macOS
+   :synopsis: Photoperiod, extraterrestrial irradiance and relative
+    sun earth distance over a latitude x day of the year grid.
+
+"""
+
+import os
+import math
+
+import numpy as np
+
+from labmet.labmetExceptions.labmetExceptions import InputTypeException
+
+__author__ = 'joaotrevizoliesteves, Murilo Ijanc'
+__copyright__ = "Copyright 2015, Lab804"
+__license__ = "BSD"
+__version__ = "0.1"
+
+
+GRID_FIELDS = ("photoperiod", "ho", "ho_mm", "ho_cal", "relative_distance")
+
+DAYS = 366
+
+
+def _grid_dtype(days=DAYS):
+    return np.dtype([("lat", np.float64)] +
+                    [(field, np.float64, (days,)) for field in GRID_FIELDS])
+
+
+class RadiationGrid(object):
+    """Radiation Grid
+
+    The radiation of the 366 days of the year of many latitudes as
+    dense (latitudes, 366) arrays, the day of the year n at the index
+    n - 1. The formulas are the ones of Photoperiod and
+    ExtraterrestrialIrradiance, the days without sunrise near the
+    poles are NaN.
+
+    The grid is a numpy record array of one record by latitude, saved
+    as a .npy file and loaded memory-mapped, so services share it
+    without computing it at startup.
+
+    :param data: The grid records, sorted by latitude
+    :type data: numpy.ndarray
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def lats(self):
+        return self.data["lat"]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getattr__(self, field):
+        if field in GRID_FIELDS:
+            return self.data[field]
+        raise AttributeError(field)
+
+    @classmethod
+    def build(cls, lats):
+        """Build
+
+        Computes the grid of the latitudes
+
+        :param lats: The latitudes in decimal degrees
+        :type lats: sequence of int or float
+
+        :rtype: RadiationGrid
+        """
+        lats = np.unique(np.asarray(lats, dtype=np.float64))
+        if lats.size == 0 or np.any(np.abs(lats) > 90.0):
+            raise InputTypeException("The latitudes must be inside "
+                                     "the interval +-90.0")
+
+        # the solar declination and distance only depend on the day
+        days = np.arange(1, DAYS + 1)
+        delta = np.radians([23.45 * math.sin(math.radians(
+            360.0 * (day - 81.0) / 365.0)) for day in days])
+        relative_distance = np.array([1.0 + 0.033 * math.cos(math.radians(
+            day * 360.0 / 365.0)) for day in days])
+
+        lat = np.radians(lats)[:, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            sunrise = np.degrees(np.arccos(-np.tan(lat) * np.tan(delta)))
+        ho = 37.6 * relative_distance * (
+            math.pi / 180.0 * sunrise * np.sin(lat) * np.sin(delta) +
+            np.cos(lat) * np.cos(delta) * np.sin(np.radians(sunrise)))
+
+        data = np.zeros(len(lats), dtype=_grid_dtype())
+        data["lat"] = lats
+        data["photoperiod"] = 2.0 * sunrise / 15.0
+        data["ho"] = ho
+        data["ho_mm"] = ho / 2.45
+        data["ho_cal"] = ho / 0.041868
+        data["relative_distance"] = relative_distance
+        return cls(data)
+
+    def save(self, path):
+        """Writes the grid to a .npy file, replacing it atomically"""
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, np.asarray(self.data))
+        getattr(os, "replace", os.rename)(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, lats=None):
+        """Load
+
+        Maps a grid saved in a .npy file, building and saving it
+        first when the file is missing or has other latitudes
+
+        :param path: The .npy file path
+        :param lats: The latitudes of the grid, default the saved ones
+
+        :type path: str
+        :type lats: sequence of int or float or None
+
+        :rtype: RadiationGrid
+        """
+        if os.path.exists(path):
+            data = np.load(path, mmap_mode="r")
+            if lats is None or np.array_equal(
+                    data["lat"], np.unique(np.asarray(lats, np.float64))):
+                return cls(data)
+        elif lats is None:
+            raise InputTypeException("There is no grid in %s, the "
+                                     "latitudes are required" % path)
+        cls.build(lats).save(path)
+        return cls(np.load(path, mmap_mode="r"))
+
+    def interpolate(self, field, lat, day):
+        """Interpolate
+
+        The field at any latitude, linearly interpolated
+        between the grid latitudes
+
+        :param field: One of GRID_FIELDS
+        :param lat: The latitudes in decimal degrees, inside the grid
+        :param day: The days of the year, between 1 and 366
+
+        :type field: str
+        :type lat: int, float or array
+        :type day: int or array
+
+        :return: The field values, with the broadcast shape of lat and day
+        :rtype: float or numpy.ndarray
+        """
+        if field not in GRID_FIELDS:
+            raise InputTypeException("The field must be one of %s" %
+                                     ", ".join(GRID_FIELDS))
+        lats = self.lats
+        lat = np.asarray(lat, dtype=np.float64)
+        day = np.asarray(day)
+        if np.any((lat < lats[0]) | (lat > lats[-1])):
+            raise InputTypeException("The latitudes must be inside the "
+                                     "grid, %s to %s" % (lats[0], lats[-1]))
+        if np.any((day < 1) | (day > DAYS)):
+            raise InputTypeException("The day of the year must be "
+                                     "between 1 and 366")
+
+        values = self.data[field]
+        if len(lats) == 1:
+            return self.__result(values[0, day - 1] + lat * 0)
+        upper = np.clip(np.searchsorted(lats, lat), 1, len(lats) - 1)
+        lower = upper - 1
+        weight = (lat - lats[lower]) / (lats[upper] - lats[lower])
+        below, above = values[lower, day - 1], values[upper, day - 1]
+        # the grid values are kept as they are on the grid latitudes
+        return self.__result(np.where(weight == 0, below, np.where(
+            weight == 1, above, below * (1.0 - weight) + above * weight)))
+
+    @staticmethod
+    def __result(values):
+        return values if values.ndim else float(values)
@@ -4,7 +4,8 @@
 import math
 from datetime import datetime
 
-from labmet.labmetExceptions.labmetExceptions import InputTypeException
+from labmet.labmetExceptions.labmetExceptions import (InputTypeException,
+                                                      InputRangeException)
 from labmet.radiation.factors import Photoperiod
 
 
@@ -52,11 +53,45 @@ class RadiationTableMethod(object):
         else:
             raise Exception('Mês varia de 1 a 12')
 
+    def interpolate_ho(self, lat, month=1):
+        """Interpolate ho
+
+        The ho of the south hemisphere table, linearly
+        interpolated between its latitudes
+
+        :param lat: Place latitude, south latitudes as
+         positive or negative degrees, between 0 and 30
+        :param month: Number of Month
+
+        :type lat: int or float
+        :type month: int
+
+        :return: Ho in mm
+        :rtype: float
+        """
+        lat = abs(float(lat))
+        lats = sorted(self.__lat_sul)
+        if not lats[0] <= lat <= lats[-1]:
+            raise InputRangeException("The table latitudes are between "
+                                      "%d and %d" % (lats[0], lats[-1]))
+        month = self.month_validation(month) - 1
+        for lower, upper in zip(lats, lats[1:]):
+            if lat <= upper:
+                break
+        below = self.__lat_sul[lower][month]
+        above = self.__lat_sul[upper][month]
+        if lat == lower:
+            return below
+        if lat == upper:
+            return above
+        return below + (above - below) * (lat - lower) / (upper - lower)
+
     def get_ho(self, hem, lat, month=1):
         """Get ho
 
         Function that gets the ho by the hemisphere,
-        latitude and number of month.
+        latitude and number of month, interpolated
+        between the table latitudes.
 
         :param hem: Hemisphere(south or North)
         :param lat: Place latitude
@@ -71,7 +106,7 @@ class RadiationTableMethod(object):
         """
         if hem == 'south':
             try:
-                return self.__lat_sul[int(lat)][self.month_validation(month) - 1]
+                return self.interpolate_ho(lat, month)
             except Exception as e:
                 print("Error: %s" % e)
         elif hem == 'north':
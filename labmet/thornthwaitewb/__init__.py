@@ -1 +1,2 @@
 from labmet.thornthwaitewb.thornthwaitewb import *
+from labmet.thornthwaitewb.series import *
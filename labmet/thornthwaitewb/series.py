@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+REPORT_FIELDS = ("precipitation_eto", "soil_water_moisture",
+                 "accumulated_negative", "variation", "real_et", "eto",
+                 "deficit", "excess", "precipitation")
+
+
+class ThornthwaiteWaterBalanceSeries(object):
+    """Thornthwaite Water Balance series
+
+    The ThornthwaiteWaterBalance of many sites over whole series of
+    periods. Each period is computed once for all the sites with
+    numpy, in the same order as the per-period class, so the two
+    agree to the float rounding of numpy exp and log.
+
+    The state of each site is kept between calls, so a long
+    series can be computed in pieces.
+
+    """
+
+    def __init__(self, awc, soil_water_moisture=0,
+                 accumulated_negative=None, variation=None, sites=None):
+        """Class init method
+
+        :param awc: The available water content in millimeters(mm),
+         one for all the sites or one by site
+        :param soil_water_moisture: The initial soil water moisture
+         in millimeters(mm), default = 0
+        :param accumulated_negative: The initial accumulated
+         negative in millimeters(mm), optional
+        :param variation: The initial variation in millimeters(mm),
+         optional
+        :param sites: The number of sites, default the size of
+         the largest param
+
+        :type awc: int, float or array
+        :type soil_water_moisture: int, float or array
+        :type accumulated_negative: int, float, array or None
+        :type variation: int, float, array or None
+        :type sites: int or None
+        """
+        params = [np.asarray(awc, dtype=np.float64),
+                  np.asarray(soil_water_moisture, dtype=np.float64)]
+        if accumulated_negative is not None:
+            params.append(np.asarray(accumulated_negative, dtype=np.float64))
+        if variation is not None:
+            params.append(np.asarray(variation, dtype=np.float64))
+        if sites is None:
+            sites = max(p.size for p in params)
+
+        def site_array(value):
+            return np.array(np.broadcast_to(value, (sites,)),
+                            dtype=np.float64)
+
+        self.awc = site_array(params[0])
+        self.soil_water_moisture = site_array(params[1])
+        self.__init_soil_water_moisture = self.soil_water_moisture.copy()
+        self.accumulated_negative = site_array(
+            0.0 if accumulated_negative is None else accumulated_negative)
+        self.variation = site_array(0.0 if variation is None else variation)
+        # False where the value is still None in the per-period class
+        self.__accumulated_negative_set = np.full(
+            sites, accumulated_negative is not None)
+        self.__variation_set = np.full(sites, variation is not None)
+
+    @property
+    def sites(self):
+        return self.awc.size
+
+    def __step(self, precipitation, eto):
+        awc = self.awc
+        eto_precipitation = precipitation - eto
+        check_etp_p = eto_precipitation >= 0
+
+        # the soil water moisture when the precipitation exceeds the eto
+        soil_water_moisture = \
+            self.__init_soil_water_moisture + precipitation - eto
+        soil_water_moisture = np.where(soil_water_moisture > awc,
+                                       awc, soil_water_moisture)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            accumulated_negative = np.where(
+                check_etp_p,
+                awc * np.log(soil_water_moisture / awc),
+                - np.abs(self.accumulated_negative) + precipitation - eto)
+        accumulated_negative = np.where(
+            self.__accumulated_negative_set, accumulated_negative,
+            np.where(check_etp_p, 0.0, eto_precipitation))
+
+        soil_water_moisture = np.where(
+            check_etp_p, soil_water_moisture,
+            awc * np.exp(-np.abs(accumulated_negative / awc)))
+
+        variation = np.where(
+            self.__variation_set,
+            soil_water_moisture - self.__init_soil_water_moisture,
+            np.where(check_etp_p, 0.0, soil_water_moisture - awc))
+
+        real_et = np.where(check_etp_p, eto, precipitation + np.abs(variation))
+        deficit = np.where(check_etp_p, 0.0, eto - real_et)
+        excess = np.where(soil_water_moisture < awc, 0.0,
+                          eto_precipitation - variation)
+
+        self.accumulated_negative = accumulated_negative
+        self.soil_water_moisture = soil_water_moisture
+        self.__init_soil_water_moisture = soil_water_moisture
+        self.variation = variation
+        self.__accumulated_negative_set[:] = True
+        self.__variation_set[:] = True
+        return (eto_precipitation, soil_water_moisture, accumulated_negative,
+                variation, real_et, eto, deficit, excess, precipitation)
+
+    def thornthwaite_water_balance(self, precipitation, eto):
+        """Thornthwaite water balance
+
+        Computes the periods in order, for all the sites at once
+
+        :param precipitation: The precipitation of each period, (periods,)
+         for one site or (sites, periods)
+        :param eto: The potential evapotranspiration of each period,
+         with the shape of precipitation
+
+        :type precipitation: array
+        :type eto: array
+
+        :return: A dict with the report fields of the per-period
+         class, each one an array with the shape of precipitation
+        :rtype: dict
+        """
+        precipitation = np.asarray(precipitation, dtype=np.float64)
+        eto = np.asarray(eto, dtype=np.float64)
+        shape = np.broadcast(precipitation, eto).shape
+        if len(shape) not in (1, 2):
+            raise ValueError("The series must be (periods,) "
+                             "or (sites, periods)")
+
+        # periods first, so each period is a contiguous row of sites
+        precipitation = np.broadcast_to(precipitation, shape).reshape(
+            -1, shape[-1]).T
+        eto = np.broadcast_to(eto, shape).reshape(-1, shape[-1]).T
+        if precipitation.shape[1] != self.sites:
+            raise ValueError("The series have %d sites, the balance %d" %
+                             (precipitation.shape[1], self.sites))
+
+        report = np.empty((len(REPORT_FIELDS),) + precipitation.shape)
+        for period in range(precipitation.shape[0]):
+            report[:, period] = self.__step(precipitation[period],
+                                            eto[period])
+
+        return dict((field, values.T.reshape(shape))
+                    for field, values in zip(REPORT_FIELDS, report))
+
+
+def thornthwaite_water_balance_series(awc, precipitation, eto,
+                                      soil_water_moisture=0,
+                                      accumulated_negative=None,
+                                      variation=None):
+    """Thornthwaite water balance of whole series
+
+    Shortcut of ThornthwaiteWaterBalanceSeries for one call,
+    see ThornthwaiteWaterBalanceSeries.thornthwaite_water_balance
+
+    :return: A dict with the report fields, as arrays
+    :rtype: dict
+    """
+    shape = np.broadcast(np.asarray(precipitation), np.asarray(eto)).shape
+    sites = shape[0] if len(shape) == 2 else 1
+    return ThornthwaiteWaterBalanceSeries(
+        awc, soil_water_moisture, accumulated_negative, variation,
+        sites=sites).thornthwaite_water_balance(precipitation, eto)
+
+
+def thornthwaite_water_balance_cycle(awc, precipitation, eto, tol=1e-6,
+                                     max_iterations=100):
+    """Cyclic Thornthwaite water balance
+
+    The climatological water balance, where the soil water at
+    the end of the cycle, usually the 12 months of the year, is
+    the one at its start.
+
+    Between two periods the whole balance state is the soil water
+    moisture, the accumulated negative being always
+    awc * log(soil_water_moisture / awc), so the steady state is
+    the fixed point of the soil water moisture at the end of the
+    cycle. It is found from the soil at its awc by fixed point
+    iteration with Aitken's delta-squared acceleration, for all the
+    sites at once, computing again only the sites not converged.
+    A site whose soil fills up in the cycle converges in 1 or 2
+    cycles, a site that only dries out converges to a dry soil.
+
+    :param awc: The available water content in millimeters(mm),
+     one for all the sites or one by site
+    :param precipitation: The precipitation of each period of the
+     cycle, (periods,) for one site or (sites, periods)
+    :param eto: The potential evapotranspiration of each period,
+     with the shape of precipitation
+    :param tol: The soil water moisture tolerance in millimeters(mm)
+    :param max_iterations: The max cycles computed by site
+
+    :type awc: int, float or array
+    :type precipitation: array
+    :type eto: array
+    :type tol: float
+    :type max_iterations: int
+
+    :return: A dict with the report fields of the steady cycle
+     as arrays, the cycles computed by site in iterations and
+     the converged sites in converged
+    :rtype: dict
+    """
+    precipitation = np.asarray(precipitation, dtype=np.float64)
+    eto = np.asarray(eto, dtype=np.float64)
+    shape = np.broadcast(precipitation, eto).shape
+    if len(shape) not in (1, 2):
+        raise ValueError("The series must be (periods,) "
+                         "or (sites, periods)")
+    precipitation = np.broadcast_to(precipitation, shape).reshape(
+        -1, shape[-1])
+    eto = np.broadcast_to(eto, shape).reshape(-1, shape[-1])
+    sites = precipitation.shape[0]
+
+    awc = np.array(np.broadcast_to(np.asarray(awc, dtype=np.float64),
+                                   (sites,)))
+    iterations = np.zeros(sites, dtype=int)
+    converged = np.zeros(sites, dtype=bool)
+    report = dict((field, np.empty((sites, shape[-1])))
+                  for field in REPORT_FIELDS)
+
+    def cycle(active, soil_water_moisture):
+        # the soil water moisture at the end of the cycle
+        site_awc = awc[active]
+        balance = ThornthwaiteWaterBalanceSeries(
+            site_awc, soil_water_moisture,
+            site_awc * np.log(np.maximum(soil_water_moisture,
+                                         np.finfo(np.float64).tiny) /
+                              site_awc),
+            0.0)
+        values = balance.thornthwaite_water_balance(precipitation[active],
+                                                    eto[active])
+        for field in REPORT_FIELDS:
+            report[field][active] = values[field]
+        iterations[active] += 1
+        return balance.soil_water_moisture
+
+    active = np.arange(sites)
+    start = awc.copy()
+    while active.size:
+        previous = start
+        estimates = [start]
+        for _ in range(2):
+            end = cycle(active, previous)
+            done = np.abs(end - previous) <= tol
+            converged[active[done]] = True
+            stop = done | (iterations[active] >= max_iterations)
+            active, previous, end = active[~stop], previous[~stop], end[~stop]
+            estimates = [e[~stop] for e in estimates] + [end]
+            previous = end
+            if not active.size:
+                break
+        if not active.size:
+            break
+
+        # Aitken's delta-squared of the last 3 estimates
+        x0, x1, x2 = estimates
+        delta = x2 - 2 * x1 + x0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            start = np.where(np.abs(delta) > 0,
+                             x0 - (x1 - x0) ** 2 / delta, x2)
+        start = np.clip(start, 0.0, awc[active])
+
+    if len(shape) == 1:
+        report = dict((field, values[0]) for field, values in report.items())
+        report["iterations"] = int(iterations[0])
+        report["converged"] = bool(converged[0])
+    else:
+        report["iterations"] = iterations
+        report["converged"] = converged
+    return report
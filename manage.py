@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
+import json
+import asyncio
+import shutil
 import signal
 
 from flask_script import Manager, Server as _Server, Option, commands
 
 from app import create_app, external
+from app.backplane import BackplaneBroker, DEFAULT_PORT
+from app.main import station_update
+from app.replay import replay
+from app.resources import MQTTIngestion
 
 manager = Manager(create_app('default'))
 
@@ -59,6 +67,13 @@ class Server(_Server):
         if use_reloader is None:
             use_reloader = app.debug
 
+        # only the reloader child subscribes
+        if app.config['MQTT_INGESTION'] and \
+                (not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN')):
+            MQTTIngestion(app, external.socketio, external.aqua_crop_registry,
+                          station_update, storage=external.storage.storage,
+                          checkpoint=app.config['MODEL_CHECKPOINT']).start()
+
         external.socketio.run(app,
                               host=host,
                               port=port,
@@ -67,10 +82,77 @@ class Server(_Server):
                               **self.server_options)
 
 
+class Replay(commands.Command):
+    help = description = ('Recomputes the AquaCrop outputs of the '
+                          'stored raw readings')
+
+    option_list = (
+        Option('-s', '--station', dest='stations', action='append',
+               default=[],
+               help='station id, repeatable, default: all the stations'),
+        Option('--start', dest='start', type=float, default=None,
+               help='first collected_at replayed'),
+        Option('--end', dest='end', type=float, default=None,
+               help='last collected_at replayed'),
+        Option('-c', '--config', dest='config', default=None,
+               help='json file with the crop config of each station id'),
+        Option('-w', '--workers', dest='workers', type=int, default=None,
+               help='processes, default: the number of cpus'),
+        Option('--chunk', dest='chunk', type=int, default=50000,
+               help='readings computed at once, default: 50000'),
+        Option('--checkpoint', dest='checkpoint', default='replay_checkpoint',
+               help='checkpoint directory, default: replay_checkpoint'),
+        Option('--restart', dest='restart', action='store_true',
+               default=False,
+               help='ignore the checkpoints of a previous replay'),
+        Option('-A', '--archive', dest='archive', default=None,
+               help='read the readings of a sensor archive directory'),
+    )
+
+    def run(self, stations, start, end, config, workers, chunk, checkpoint,
+            restart, archive):
+        configs = {}
+        if config is not None:
+            with open(config) as config_file:
+                configs = dict((str(k), v) for k, v in
+                               json.load(config_file).items())
+        if restart and os.path.isdir(checkpoint):
+            shutil.rmtree(checkpoint)
+
+        replayed = replay(manager.app.config['STORAGE_URL'], stations,
+                          configs, external.aquacrop_data, start, end,
+                          checkpoint, workers, chunk, archive)
+        print("%d readings replayed" % sum(replayed.values()))
+
+
+class Backplane(commands.Command):
+    help = description = ('Runs the message queue broker shared by '
+                          'the Socket.IO servers')
+
+    option_list = (
+        Option('-h', '--host', dest='host', default='127.0.0.1',
+               help='listen host, default: 127.0.0.1'),
+        Option('-p', '--port', dest='port', type=int, default=DEFAULT_PORT,
+               help='listen port, default: %d' % DEFAULT_PORT),
+    )
+
+    def run(self, host, port):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        broker = loop.run_until_complete(BackplaneBroker(host, port).start())
+        print("Backplane on labmet://%s:%d" % (host, port))
+        try:
+            loop.run_forever()
+        finally:
+            broker.close()
+
+
 manager.add_command("runserver", Server())
 manager.add_command("clean", commands.Clean())
 manager.add_command("shell", commands.Shell())
 manager.add_command("urls", commands.ShowUrls())
+manager.add_command("replay", Replay())
+manager.add_command("backplane", Backplane())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Routes the station readings to the sharded workers,
+see app.sharding. Run one worker.py --shard NAME by shard.
+"""
+
+import sys
+import time
+import argparse
+
+import paho.mqtt.client as mqtt
+
+from app.sharding import HashRing, ShardRouter
+
+
+# Arguments
+ap = argparse.ArgumentParser()
+ap.add_argument("-host", "--host", type=str, default="0.0.0.0",
+                help="broker host")
+ap.add_argument("-port", "--port", type=int, default=1883,
+                help="broker port")
+ap.add_argument("-k", "--keepalive", type=int, default=60,
+                help="keepalive")
+ap.add_argument("-u", "--user", type=str, default="server_listener",
+                help="user")
+ap.add_argument("-p", "--password", type=str, default="l4b804",
+                help="password")
+ap.add_argument("-t", "--topic", type=str, default="weather_data",
+                help="topic of the station readings")
+ap.add_argument("-q", "--qqos", type=int, default=0,
+                help="qos")
+ap.add_argument("-s", "--shards", type=str, required=True,
+                help="comma separated shard names, e.g. a,b,c")
+ap.add_argument("-v", "--vnodes", type=int, default=64,
+                help="points on the ring by shard, default: 64")
+ap.add_argument("-S", "--stats", type=float, default=0,
+                help="print the readings by shard every S seconds")
+args = vars(ap.parse_args())
+
+
+def on_connect(client, router, flags, rc):
+    print("Connected MQTT [%s:%s] topic [%s] shards [%s]" %
+          (args['host'], args['port'], args['topic'],
+           ", ".join(router.ring.shards)))
+    router.subscribe()
+
+
+def main():
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.username_pw_set(username=args['user'],
+                           password=args['password'])
+
+    ring = HashRing(args['shards'].split(","), args['vnodes'])
+    router = ShardRouter(client, args['topic'], ring, args['qqos'])
+    client.user_data_set(router)
+    client.connect(args['host'], args['port'], args['keepalive'])
+
+    if args['stats'] <= 0:
+        client.loop_forever()
+        return
+    client.loop_start()
+    while True:
+        time.sleep(args['stats'])
+        routed = sorted(router.routed.items())
+        print("routed %s errors %d" %
+              (" ".join("%s=%d" % item for item in routed), router.errors))
+
+
+# public
+try:
+    print("Press CTRL+C to exit.")
+    main()
+except (KeyboardInterrupt, SystemExit):
+    sys.exit()
@@ -1,33 +1,33 @@
 import os
 import sys
-import signal
 
 
 from app import create_app, external
-from app.resources import MQTTThread
+from app.main import station_update
+from app.resources import MQTTIngestion
 
 app = create_app(os.environ.get('PROD') or 'default')
 
-mqtt_thread = MQTTThread()
-mqtt_thread.start()
-
-# 
-# def signal_handler(signal, frame):
-#     mqtt_thread.stop = True
-#     sys.exit(0)
-#
-# signal.signal(signal.SIGINT, signal_handler)
+mqtt_ingestion = None
+if app.config['MQTT_INGESTION']:
+    mqtt_ingestion = MQTTIngestion(app, external.socketio,
+                                   external.aqua_crop_registry, station_update,
+                                   storage=external.storage.storage,
+                                   checkpoint=app.config['MODEL_CHECKPOINT'])
+    mqtt_ingestion.start()
 
 
 def main():
 
     external.socketio.run(app,
                           host=os.environ.get('HOST') or '0.0.0.0',
-                          port=int(os.environ.get('PORT')) or 80)
+                          port=int(os.environ.get('PORT') or 80))
 
 if __name__ == '__main__':
     try:
         main()
     except KeyboardInterrupt:
-        mqtt_thread.stop = True
+        if mqtt_ingestion is not None:
+            mqtt_ingestion.stop = True
+            mqtt_ingestion.join()
         sys.exit(0)
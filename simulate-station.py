@@ -2,16 +2,27 @@
 """
 Do you have station? This file simulate a
 weather station.
+
+With -n the simulator is a load generator: it publishes the
+readings of n stations from one event loop, at a rate by station
+with jitter and bursts, and reports the publish throughput and
+latency percentiles. With --stub it also runs an in-process MQTT
+broker stub on host:port, so worker.py can be tested without a broker.
 """
 
 import sys
 import time
-import json
+import math
 import random
+import asyncio
 import argparse
-from datetime import datetime
+import threading
+from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
-from datetime import datetime
+
+from app.codec import FORMATS, get_codec
+from app.metrics import LatencyHistogram
+from app.mqtt_stub import MQTTBrokerStub
 
 
 def random_data(_id=1):
@@ -19,7 +30,8 @@ def random_data(_id=1):
 
     data = {
         "id": _id,
-        "collected_at": datetime.now().strftime("%m/%d/%YT%H:%M:%S"),
+        "collected_at": datetime.now(timezone.utc).strftime(
+            "%m/%d/%YT%H:%M:%S"),
         "bmp180_temp": random.uniform(10.0, 50.0),
         "bmp180_alt": random.uniform(100.0, 3000.0),
         "bmp180_press": random.uniform(1.5, 1.9),
@@ -32,6 +44,185 @@ def random_data(_id=1):
 
     return data
 
+
+class DiurnalStation(object):
+    """Station with diurnal curves
+
+    The illuminance follows the sun between 6h and 18h and the
+    temperature a sine with its min at 3h and its max at 15h,
+    both with noise. The soil moisture dries slowly and is
+    refilled by random rains.
+
+    :param _id: The station id
+    :param time_scale: Simulated seconds by real second
+    """
+
+    def __init__(self, _id, time_scale=1.0):
+        self.id = _id
+        self.time_scale = time_scale
+        self.start = time.time()
+        self.mean_temp = random.uniform(15.0, 28.0)
+        self.temp_amplitude = random.uniform(4.0, 9.0)
+        self.peak_illuminance = random.uniform(600.0, 1000.0)
+        self.altitude = random.uniform(100.0, 3000.0)
+        self.soil_moisture = random.uniform(20.0, 50.0)
+        self.last = self.start
+
+    def now(self):
+        return self.start + (time.time() - self.start) * self.time_scale
+
+    def data(self):
+        now = self.now()
+        moment = datetime.fromtimestamp(now)
+        hour = moment.hour + moment.minute / 60.0 + moment.second / 3600.0
+
+        sun = max(0.0, math.sin(math.pi * (hour - 6.0) / 12.0))
+        illuminance = self.peak_illuminance * sun * random.uniform(0.8, 1.0)
+        temp = self.mean_temp + self.temp_amplitude * \
+            math.sin(math.pi * (hour - 9.0) / 12.0) + random.gauss(0, 0.3)
+
+        days = (now - self.last) / 86400.0
+        self.last = now
+        self.soil_moisture = max(1.0, self.soil_moisture - 2.0 * days)
+        if random.random() < days / 7.0:
+            self.soil_moisture = min(50.0, self.soil_moisture +
+                                     random.uniform(5.0, 20.0))
+
+        humid = min(95.0, max(1.0, 90.0 - 2.5 * (temp - self.mean_temp) -
+                              30.0 * sun))
+        return {
+            "id": self.id,
+            "collected_at": datetime.fromtimestamp(
+                now, timezone.utc).strftime("%m/%d/%YT%H:%M:%S"),
+            "bmp180_temp": temp + random.gauss(0, 0.2),
+            "bmp180_alt": self.altitude,
+            "bmp180_press": random.uniform(1.5, 1.9),
+            "ds18b20_temp": temp,
+            "dht22_temp": temp + random.gauss(0, 0.2),
+            "dht22_humid": humid,
+            "bh1750_illuminance": int(illuminance),
+            "analog_soil_moisture": self.soil_moisture
+        }
+
+
+class LoadGenerator(object):
+    """Load Generator
+
+    The readings of each station are scheduled at rate per second
+    with a random jitter, plus a burst of burst_size readings every
+    burst seconds. The latency of a reading is the time between its
+    schedule and its write to the broker socket, counted in fixed
+    size histograms so a long run keeps a constant memory.
+
+    :param clients: The connected MQTT clients, the stations are
+     spread over them
+    :param stations: The simulated stations
+    :param topic: The publish topic
+    :param rate: Readings by second of each station
+    :param jitter: Random fraction of the interval added or removed
+    :param burst: Seconds between bursts, 0 for none
+    :param burst_size: Readings of each station in a burst
+    :param qos: The publish qos
+    :param codec: The payload wire format
+    """
+
+    def __init__(self, clients, stations, topic, rate=1.0, jitter=0.1,
+                 burst=0, burst_size=10, qos=0, codec=None):
+        self.clients = clients
+        self.stations = stations
+        self.topic = topic
+        self.interval = 1.0 / rate
+        self.jitter = jitter
+        self.burst = burst
+        self.burst_size = burst_size
+        self.qos = qos
+        self.codec = codec or get_codec("json")
+        self.published = 0
+        self.errors = 0
+        self.latencies = LatencyHistogram()
+        self.total_latencies = LatencyHistogram()
+        self._scheduled = {}
+        self._written = {}
+        self._lock = threading.Lock()
+        for client in clients:
+            client.on_publish = self.on_publish
+
+    def _record(self, latency):
+        self.latencies.record(latency)
+        self.total_latencies.record(latency)
+        self.published += 1
+
+    def on_publish(self, client, userdata, mid):
+        now = time.time()
+        with self._lock:
+            scheduled = self._scheduled.pop((id(client), mid), None)
+            if scheduled is None:
+                # written before publish returned
+                self._written[(id(client), mid)] = now
+            else:
+                self._record(now - scheduled)
+
+    def publish(self, station, scheduled):
+        client = self.clients[hash(station.id) % len(self.clients)]
+        payload = self.codec.dumps(station.data())
+        info = client.publish(self.topic, payload, self.qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.errors += 1
+            return
+        with self._lock:
+            written = self._written.pop((id(client), info.mid), None)
+            if written is None:
+                self._scheduled[(id(client), info.mid)] = scheduled
+            else:
+                self._record(written - scheduled)
+
+    async def run_station(self, station):
+        # spread the stations start over one interval
+        scheduled = time.time() + random.uniform(0, self.interval)
+        while True:
+            await asyncio.sleep(max(0.0, scheduled - time.time()))
+            self.publish(station, scheduled)
+            scheduled += self.interval * (1.0 + random.uniform(-self.jitter,
+                                                               self.jitter))
+
+    async def run_bursts(self):
+        while True:
+            await asyncio.sleep(self.burst)
+            scheduled = time.time()
+            for _ in range(self.burst_size):
+                for station in self.stations:
+                    self.publish(station, scheduled)
+                await asyncio.sleep(0)
+
+    def tasks(self):
+        tasks = [asyncio.ensure_future(self.run_station(station))
+                 for station in self.stations]
+        if self.burst > 0:
+            tasks.append(asyncio.ensure_future(self.run_bursts()))
+        return tasks
+
+    def report(self, elapsed, published, total=False):
+        with self._lock:
+            latencies, self.latencies = self.latencies, LatencyHistogram()
+            if total:
+                latencies = self.total_latencies
+        print("%.0f msg/s published %d errors %d latency ms "
+              "p50 %.2f p90 %.2f p99 %.2f max %.2f" %
+              (published / elapsed if elapsed > 0 else 0, self.published,
+               self.errors, latencies.percentile(50) * 1000,
+               latencies.percentile(90) * 1000,
+               latencies.percentile(99) * 1000,
+               (latencies.max if latencies.count else float("nan")) * 1000))
+
+    async def run_reports(self, interval):
+        last, last_published = time.time(), 0
+        while True:
+            await asyncio.sleep(interval)
+            now, published = time.time(), self.published
+            self.report(now - last, published - last_published)
+            last, last_published = now, published
+
+
 # Arguments
 ap = argparse.ArgumentParser()
 ap.add_argument("-host", "--host", type=str, default="0.0.0.0",
@@ -50,30 +241,113 @@ ap.add_argument("-d", "--delay", type=float, default=1.0,
                 help="delay")
 ap.add_argument("-i", "--id", type=int, default=1,
                 help="id simulate")
+ap.add_argument("-n", "--stations", type=int, default=0,
+                help="load mode, stations simulated from id, default: off")
+ap.add_argument("-r", "--rate", type=float, default=None,
+                help="readings by second of each station, default: 1/delay")
+ap.add_argument("-j", "--jitter", type=float, default=0.1,
+                help="random fraction of the interval, default: 0.1")
+ap.add_argument("-B", "--burst", type=float, default=0,
+                help="seconds between bursts, default: off")
+ap.add_argument("-bs", "--burst-size", type=int, default=10,
+                help="readings of each station in a burst, default: 10")
+ap.add_argument("-ts", "--time-scale", type=float, default=1.0,
+                help="simulated seconds by second of the diurnal curves")
+ap.add_argument("-c", "--connections", type=int, default=1,
+                help="mqtt connections of the load mode, default: 1")
+ap.add_argument("-q", "--qos", type=int, default=0,
+                help="publish qos, default: 0")
+ap.add_argument("-D", "--duration", type=float, default=0,
+                help="seconds of load, default: until CTRL+C")
+ap.add_argument("-R", "--report", type=float, default=1.0,
+                help="seconds between reports, default: 1.0")
+ap.add_argument("-F", "--format", type=str, default="json",
+                choices=FORMATS, help="payload format, default: json")
+ap.add_argument("--stub", action="store_true", default=False,
+                help="run an in-process broker stub on host:port")
 args = vars(ap.parse_args())
 
 
-# clinent mqtt
-client = mqtt.Client()
+def connect():
+    # clinent mqtt
+    client = mqtt.Client()
 
+    # Set username and password
+    client.username_pw_set(username=args['user'],
+                           password=args['password'])
 
-# Set username and password
-client.username_pw_set(username=args['user'],
-                       password=args['password'])
+    # connect
+    client.connect(args['host'],
+                   args['port'],
+                   args['keepalive'])
+    return client
 
-# connect
-client.connect(args['host'],
-               args['port'],
-               args['keepalive'])
 
-# public
-try:
+def simulate():
+    codec = get_codec(args['format'])
+    client = connect()
     while True:
         try:
-            payload = json.dumps(random_data(args['id']))
+            payload = codec.dumps(random_data(args['id']))
             client.publish(args['topic'], payload)
             time.sleep(args['delay'])
         except ZeroDivisionError:
             pass
+
+
+def load():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stub = None
+    if args['stub']:
+        stub = loop.run_until_complete(
+            MQTTBrokerStub(args['host'], args['port']).start())
+
+    clients = []
+    for _ in range(args['connections']):
+        client = connect()
+        client.loop_start()
+        clients.append(client)
+
+    stations = [DiurnalStation(args['id'] + i, args['time_scale'])
+                for i in range(args['stations'])]
+    generator = LoadGenerator(clients, stations, args['topic'],
+                              args['rate'] or 1.0 / args['delay'],
+                              args['jitter'], args['burst'],
+                              args['burst_size'], args['qos'],
+                              get_codec(args['format']))
+
+    tasks = generator.tasks()
+    if args['report'] > 0:
+        tasks.append(asyncio.ensure_future(
+            generator.run_reports(args['report'])))
+
+    start = time.time()
+    try:
+        if args['duration'] > 0:
+            loop.run_until_complete(asyncio.sleep(args['duration']))
+        else:
+            loop.run_until_complete(asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        time.sleep(0.1)  # last on_publish callbacks
+        for client in clients:
+            client.loop_stop()
+            client.disconnect()
+        if stub is not None:
+            print("stub received %d delivered %d dropped %d" %
+                  (stub.received, stub.delivered, stub.dropped))
+            stub.close()
+        print("total:")
+        generator.report(time.time() - start, generator.published, True)
+
+
+# public
+try:
+    if args['stations'] > 0:
+        load()
+    else:
+        simulate()
 except (KeyboardInterrupt, SystemExit):
     sys.exit()
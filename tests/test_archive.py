@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from app.storage import SensorArchive, READING_FIELDS
+from app.storage import archive as archive_module
+
+DAY = 1460000000
+
+
+def values(value, count=1):
+    return dict((f, np.full(count, value)) for f in READING_FIELDS)
+
+
+def test_a_failed_append_does_not_shift_the_next_rows(tmpdir, monkeypatch):
+    archive = SensorArchive(str(tmpdir))
+    archive.append("1", [DAY], values(1.0))
+
+    # the write fails after the first sensor columns, before the index
+    written = []
+
+    def failing_open(path, mode="r"):
+        if mode == "ab" and len(written) == 3:
+            raise OSError(28, "No space left on device")
+        written.append(path)
+        return open(path, mode)
+    monkeypatch.setattr(archive_module, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        archive.append("1", [DAY + 1], values(2.0))
+    monkeypatch.undo()
+
+    archive.append("1", [DAY + 2], values(3.0))
+    rows = archive.readings_array("1")
+    assert rows[:, 0].tolist() == [DAY, DAY + 2]
+    assert rows[:, 1:].tolist() == [[1.0] * len(READING_FIELDS),
+                                    [3.0] * len(READING_FIELDS)]
@@ -0,0 +1,53 @@
+import time
+import asyncio
+import threading
+
+import socketio
+
+from app.backplane import BackplaneBroker, BackplaneManager
+
+
+def start_broker():
+    loop = asyncio.new_event_loop()
+    broker = loop.run_until_complete(BackplaneBroker("127.0.0.1", 0).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = broker._server.sockets[0].getsockname()[1]
+    return loop, broker, port
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_an_emit_crosses_to_the_other_server():
+    loop, broker, port = start_broker()
+    try:
+        url = "labmet://127.0.0.1:%d" % port
+        servers = [socketio.Server(async_mode="threading",
+                                   client_manager=BackplaneManager(
+                                       url, channel="test"))
+                   for _ in range(2)]
+        received = []
+        manager = servers[1].manager
+        handle_emit = manager._handle_emit
+
+        def record(message):
+            received.append(message)
+            return handle_emit(message)
+        manager._handle_emit = record
+        for server in servers:
+            server.manager.initialize()
+        # both listeners subscribed
+        assert wait_for(lambda: len(broker._channels.get("test", ())) == 2)
+
+        servers[0].emit("station_batch", {"id": 1},
+                        namespace="/weather_data", room="station-1")
+        assert wait_for(lambda: received)
+        assert received[0]["event"] == "station_batch"
+        assert received[0]["data"] == [{"id": 1}]
+        assert received[0]["room"] == "station-1"
+    finally:
+        loop.call_soon_threadsafe(broker.close)
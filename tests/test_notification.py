@@ -0,0 +1,110 @@
+import json
+import time
+import threading
+
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # py2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from app.main.notification import Notification, NotificationDispatcher
+
+
+class PushStub(HTTPServer):
+    """The push api of the notifications, on localhost"""
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), PushHandler)
+        self.tokens = ["token-1"]
+        self.statuses = []
+        self.token_requests = 0
+        self.pushes = []
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+
+class PushHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.token_requests += 1
+        self._reply(200, {"meta": {"status": 200},
+                          "data": [{"token": t} for t in self.server.tokens]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(
+            int(self.headers["Content-Length"])).decode("utf-8"))
+        self.server.pushes.append(body)
+        status = self.server.statuses.pop(0) if self.server.statuses \
+            else 201
+        self._reply(status, {"meta": {"status": status}})
+
+
+@pytest.fixture
+def stub():
+    server = PushStub()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_a_batch_is_retried_after_a_server_error(stub):
+    stub.statuses = [503]
+    dispatcher = NotificationDispatcher(
+        Notification("key", base_url=stub.url), batch_window=0.2,
+        backoff=0.01)
+    assert dispatcher.send("dry")
+    assert dispatcher.send("stress")
+    assert dispatcher.send("dry")
+
+    assert wait_for(lambda: dispatcher.sent == 2)
+    assert dispatcher.failed == 0
+    assert len(stub.pushes) == 2
+    assert stub.pushes[-1]["tokens"] == ["token-1"]
+    assert stub.pushes[-1]["notification"]["message"] == "dry\nstress"
+
+
+def test_a_batch_without_tokens_is_dropped(stub):
+    stub.tokens = []
+    dispatcher = NotificationDispatcher(
+        Notification("key", base_url=stub.url), backoff=0.01)
+    assert dispatcher.dispatch(["dry", "stress"]) is False
+    assert dispatcher.sent == 0
+    assert dispatcher.dropped == 2
+    assert stub.pushes == []
+
+
+def test_the_tokens_are_fetched_again_after_their_ttl(stub):
+    notification = Notification("key", base_url=stub.url, token_ttl=0.2)
+    assert notification.get_tokens() == ["token-1"]
+    stub.tokens = ["token-2"]
+    assert notification.get_tokens() == ["token-1"]
+    assert stub.token_requests == 1
+
+    time.sleep(0.3)
+    assert notification.get_tokens() == ["token-2"]
+    assert stub.token_requests == 2
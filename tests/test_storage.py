@@ -0,0 +1,38 @@
+from app.storage import StorageWriter, READING_FIELDS, OUTPUT_FIELDS
+
+
+class FlakyStorage(object):
+
+    def __init__(self):
+        self.fail = True
+        self.readings = []
+        self.outputs = []
+
+    def insert_readings(self, rows):
+        if self.fail:
+            raise RuntimeError("database is locked")
+        self.readings.extend(rows)
+
+    def insert_outputs(self, rows):
+        self.outputs.extend(rows)
+
+
+def reading(collected_at):
+    data = dict((f, 1.0) for f in READING_FIELDS + OUTPUT_FIELDS)
+    data.update(id=1, collected_at=collected_at)
+    return data
+
+
+def test_writer_keeps_the_rows_of_a_failed_flush():
+    storage = FlakyStorage()
+    writer = StorageWriter(storage, batch_size=3)
+    for t in range(5):
+        writer.add(reading(t))
+    assert writer.errors == 1
+    assert len(writer) == 10
+
+    storage.fail = False
+    assert writer.flush() == 10
+    assert [row[1] for row in storage.readings] == [0, 1, 2, 3, 4]
+    assert len(storage.outputs) == 5
+    assert len(writer) == 0
@@ -6,12 +6,22 @@ weather station.
 
 import sys
 import json
+import asyncio
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import paho.mqtt.client as mqtt
 from socketIO_client import SocketIO
-from datetime import datetime
 
-from app.external import aqua_crop_model
+from config import Config
+from app.checkpoint import load_states, save_states
+from app.codec import FORMATS, decode, get_codec
+from app.external import aqua_crop_registry
+from app.ingestion import (AsyncMQTTConsumer, IngestionPipeline,
+                           process_reading)
+from app.metrics import stamp
+from app.sharding import ShardMember
+from app.storage import StorageWriter, SensorArchive, create_storage
 
 
 # Arguments
@@ -32,60 +42,186 @@ ap.add_argument("-p", "--password", type=str, default="l4b804",
                 help="password")
 ap.add_argument("-t", "--topic", type=str, default="weather_data",
                 help="topic")
+ap.add_argument("-sh", "--shard", type=str, default=None,
+                help="shard name, reads the router topic of the shard")
 ap.add_argument("-q", "--qqos", type=int, default=0,
                 help="qqos default: 0")
-ap.add_argument("-w", "--wait", type=float, default=1.0,
-                help="socket wait")
+ap.add_argument("-c", "--publishers", type=int, default=2,
+                help="concurrent socket publishers, default: 2")
+ap.add_argument("-b", "--queue-size", type=int, default=1024,
+                help="queue size of each stage, default: 1024")
+ap.add_argument("-F", "--format", type=str, default="json",
+                choices=FORMATS,
+                help="format of the socket emits, default: json")
+ap.add_argument("-S", "--stats", type=float, default=0,
+                help="print the throughput every S seconds, default: off")
+ap.add_argument("-db", "--storage", type=str, default=Config.STORAGE_URL,
+                help="storage url, empty to disable, default: %s" %
+                     Config.STORAGE_URL)
+ap.add_argument("-A", "--archive", type=str, default=None,
+                help="directory of a columnar archive of the raw readings")
+ap.add_argument("-f", "--flush", type=float, default=1.0,
+                help="storage flush interval in seconds, default: 1.0")
+ap.add_argument("-s", "--stations", type=str, default=None,
+                help="json file with the crop config of each station id")
+ap.add_argument("-m", "--max-stations", type=int, default=1024,
+                help="max station models kept in memory, default: 1024")
+ap.add_argument("-ttl", "--ttl", type=float, default=None,
+                help="seconds to drop an idle station model")
+ap.add_argument("-ck", "--checkpoint", type=str, default=None,
+                help="file of the station models state, loaded at start")
+ap.add_argument("-ci", "--checkpoint-interval", type=float, default=60.0,
+                help="seconds between checkpoints, default: 60")
 args = vars(ap.parse_args())
 
-# SocketIO
-socketIO = SocketIO(args['sockethost'], args['sport'])
+# Station models
+if args['stations'] is not None:
+    with open(args['stations']) as stations_file:
+        aqua_crop_registry.configs.update(
+            (str(k), v) for k, v in json.load(stations_file).items())
+aqua_crop_registry.maxsize = args['max_stations']
+aqua_crop_registry.ttl = args['ttl']
 
 
-def on_connect(client, userdata, flags, rc):
-    print("Connected MQTT [%s:%s] topic [%s]" % (args['host'], args['port'],
-                                                 args['topic']))
+class SocketIOPublisher(object):
+    """Socket.IO publisher
+
+    One socket connection by publisher, each one used by its own
+    thread so the blocking emits never run in the event loop.
+    """
+
+    def __init__(self, host, port, connections, codec):
+        self.codec = codec
+        self.sockets = [SocketIO(host, port) for _ in range(connections)]
+        self.executors = [ThreadPoolExecutor(max_workers=1)
+                          for _ in range(connections)]
+
+    def emit(self, index, data):
+        stamp(data, "client_emit")
+        self.sockets[index].emit('stations', self.codec.dumps(data))
 
+    async def __call__(self, index, data):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executors[index],
+                                   self.emit, index, data)
 
-def on_message(client, userdata, msg):
-    """this function send to"""
-    payload = msg.payload.decode('utf-8')  # py3
-    data = json.loads(payload)
 
-    productivity_values_data = {"soil_moisture": data["analog_soil_moisture"],
-                                "temperature": data["ds18b20_temp"],
-                                "illuminance": data["bh1750_illuminance"],
-                                "date": datetime.now()
-                                }
+async def checkpoint_states(path, interval):
+    while True:
+        await asyncio.sleep(interval)
+        save_states(aqua_crop_registry, path)
 
-    productivity_values = aqua_crop_model.aqua_crop(**productivity_values_data)
-    print(data)
-    data.update(productivity_values)
-    socketIO.emit('stations', json.dumps(data))
-    socketIO.wait(seconds=args['wait'])
 
+async def release_handoffs(member, interval=1.0):
+    while True:
+        await asyncio.sleep(interval)
+        member.release_expired()
 
-# client mqtt
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
 
-# Set username and password
-client.username_pw_set(username=args['user'],
-                       password=args['password'])
+def flush_writers(writers):
+    """Flushes every writer, a failed one keeps its rows
+    for the next flush and counts the error"""
+    for writer in writers:
+        try:
+            writer.flush()
+        except Exception as e:
+            print("Storage error: %s" % e)
 
-# connect
-client.connect(args['host'],
-               args['port'],
-               args['keepalive'])
 
-# Subscrive
-client.subscribe(args['topic'], args['qqos'])
+async def flush_storage(writers, interval):
+    while True:
+        await asyncio.sleep(interval)
+        flush_writers(writers)
+
+
+def on_connect(client, userdata, flags, rc):
+    if userdata is not None:
+        print("Connected MQTT [%s:%s] topic [%s]" %
+              (args['host'], args['port'], userdata.readings_topic))
+        userdata.subscribe()
+        return
+    print("Connected MQTT [%s:%s] topic [%s]" % (args['host'], args['port'],
+                                                 args['topic']))
+    # Subscrive
+    client.subscribe(args['topic'], args['qqos'])
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if args['checkpoint']:
+        print("%d station states loaded" %
+              load_states(aqua_crop_registry, args['checkpoint']))
+
+    writers = []
+    if args['storage']:
+        writers.append(StorageWriter(create_storage(args['storage'])))
+    if args['archive']:
+        writers.append(StorageWriter(SensorArchive(args['archive'])))
+
+    member = None
+
+    def process(payload):
+        data = decode(payload)
+        if member is not None and not member.accept(data, payload):
+            return None
+        data = process_reading(aqua_crop_registry, data)
+        for writer in writers:
+            writer.add(data)
+        return data
+
+    pipeline = IngestionPipeline(process,
+                                 SocketIOPublisher(args['sockethost'],
+                                                   args['sport'],
+                                                   args['publishers'],
+                                                   get_codec(args['format'])),
+                                 queue_size=args['queue_size'],
+                                 publishers=args['publishers'])
+
+    # client mqtt
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    if args['shard'] is not None:
+        member = ShardMember(client, aqua_crop_registry, args['topic'],
+                             args['shard'], args['qqos'],
+                             release=pipeline.feed)
+        client.user_data_set(member)
+
+    # Set username and password
+    client.username_pw_set(username=args['user'],
+                           password=args['password'])
+
+    # connect
+    client.connect(args['host'],
+                   args['port'],
+                   args['keepalive'])
+
+    consumer = AsyncMQTTConsumer(client, pipeline, loop=loop)
+    tasks = pipeline.tasks() + [asyncio.ensure_future(consumer.run())]
+    if args['stats'] > 0:
+        tasks.append(asyncio.ensure_future(pipeline.stats(args['stats'])))
+    if member is not None:
+        tasks.append(asyncio.ensure_future(release_handoffs(member)))
+    if writers:
+        tasks.append(asyncio.ensure_future(flush_storage(writers,
+                                                         args['flush'])))
+
+    if args['checkpoint']:
+        tasks.append(asyncio.ensure_future(checkpoint_states(
+            args['checkpoint'], args['checkpoint_interval'])))
+
+    try:
+        loop.run_until_complete(asyncio.gather(*tasks))
+    finally:
+        flush_writers(writers)
+        if args['checkpoint']:
+            save_states(aqua_crop_registry, args['checkpoint'])
+
 
 # public
 try:
     print("Press CTRL+C to exit.")
-    client.loop_forever(timeout=1.0, max_packets=1,
-                        retry_first_connection=False)
+    main()
 except (KeyboardInterrupt, SystemExit):
     sys.exit()